@@ -1,14 +1,67 @@
 import os
+import re
 from functools import cache
 from pathlib import Path
-from typing import Optional
+from types import MappingProxyType
+from typing import Optional, Callable, Mapping, Any
 
 from datavac.util.conf import CONFIG
 from datavac.util.logging import logger
-from datavac.util.util import import_modfunc
 
+# Database-related environment variables, read once at import (see _refresh_environment)
+_DBSTRING: Optional[str] = os.environ.get('DATAVACUUM_DBSTRING')
+_DRIVER: Optional[str] = os.environ.get('DATAVACUUM_DB_DRIVERNAME')
+_SSLROOT: Optional[str] = os.environ.get('DATAVACUUM_SSLROOTCERT')
 
-def get_db_connection_info() -> dict:
+# Matches each "key=value;" pair of a DBSTRING, ignoring surrounding whitespace and any trailing semicolon.
+# As in ODBC connection strings, a value may be wrapped in braces, eg "Password={a;b}", to contain semicolons
+# (and a value starting with a brace must be so wrapped).
+_DBSTRING_RE=re.compile(r'\s*([^=;\s]+)\s*=\s*(?:\{([^}]*)\}|(?!\{)([^;]*?))\s*(?:;|$)')
+def _parse_dbstring(dbstring: str) -> dict[str,str]:
+    """Parses a DBSTRING into a dict, raising ValueError if any part of it isn't a "key=value" pair."""
+    info,pos={},0
+    while dbstring[pos:].strip():
+        # Only the position is reported, since the rest of the string may hold the password
+        if (m:=_DBSTRING_RE.match(dbstring,pos)) is None:
+            raise ValueError(f"Malformed DATAVACUUM_DBSTRING at character {pos}, expected \"key=value\"")
+        info[m[1]]=m[2] if m[2] is not None else m[3]
+        pos=m.end()
+    return info
+
+# Functions named by dotpaths in the configuration, resolved on first use
+_resolved_funcs: dict[str,Callable] = {}
+def _resolve_modfunc(dotpath) -> Callable:
+    key=dotpath if type(dotpath) is str else repr(dotpath)
+    if (func:=_resolved_funcs.get(key,None)) is None:
+        from datavac.util.util import import_modfunc
+        func=_resolved_funcs[key]=import_modfunc(dotpath)
+    return func
+
+@cache
+def _get_credentials_config() -> dict:
+    """The database.credentials section of the configuration (empty if not present)."""
+    return CONFIG.get('database',{}).get('credentials',{})
+
+# Where the database connection info and SSL root certificate come from (see _init_providers)
+_DB_INFO_PROVIDER: Optional[Callable[[],dict]] = None
+_SSL_ROOTCERT_PROVIDER: Optional[Callable[[],Optional[str]]] = None
+def _init_providers():
+    """Decides once, from the configuration, which functions supply the connection info and SSL root certificate."""
+    global _DB_INFO_PROVIDER, _SSL_ROOTCERT_PROVIDER
+    creds=_get_credentials_config()
+    if (dotpath:=creds.get('get_db_connection_info')) is None:
+        logger.debug("No database.credentials.get_db_connection_info configured, falling back on environment")
+        _DB_INFO_PROVIDER=get_db_connection_info_from_environment
+    else:
+        _DB_INFO_PROVIDER=_resolve_modfunc(dotpath)
+    if (dotpath:=creds.get('get_ssl_rootcert_for_db')) is None:
+        logger.debug("No database.credentials.get_ssl_rootcert_for_db configured, falling back on environment")
+        _SSL_ROOTCERT_PROVIDER=(lambda: _SSLROOT)
+    else:
+        _SSL_ROOTCERT_PROVIDER=_resolve_modfunc(dotpath)
+
+@cache
+def get_db_connection_info() -> Mapping[str,Any]:
     """ Returns the connection information for the database
 
     If a replacement function is designated in the configuration (database.credentials.get_db_connection_info),
@@ -21,46 +74,58 @@ def get_db_connection_info() -> dict:
     each of which maps to a string, eg sslmode->'verify_full', sslrootcert->path to root certificate.
     The Driver string should be recognized by URL as a SQLAlchemy driver.
 
+    The result is cached for the life of the process (call get_db_connection_info.cache_clear() to re-read),
+    and is shared between callers, so it is returned as a read-only mapping (as is "sslargs").  Copy it with
+    dict(...) if a mutable version is needed.
+
     Returns:
-        dict: connection info
+        Mapping[str,Any]: connection info
     """
-    try:
-        dotpath=CONFIG['database']['credentials']['get_db_connection_info']
-    except KeyError:
-        logger.debug("No database.credentials.get_db_connection_info configured, falling back on environment")
-        connection_info=get_db_connection_info_from_environment()
-    else:
-        connection_info=import_modfunc(dotpath)()
-    return connection_info
+    if _DB_INFO_PROVIDER is None: _init_providers()
+    connection_info=dict(_DB_INFO_PROVIDER())
+    connection_info['sslargs']=MappingProxyType(dict(connection_info['sslargs']))
+    return MappingProxyType(connection_info)
 
 def get_db_connection_info_from_environment(dbstring:Optional[str]=None) -> dict:
     """ See get_db_connection_info, this is just the fallback-to-environment case. """
-    dbstring=dbstring or os.environ['DATAVACUUM_DBSTRING']
-    connection_info=dict([[s.strip() for s in x.split("=")] for x in dbstring.split(";")])
-    connection_info['Driver']=os.environ.get('DATAVACUUM_DB_DRIVERNAME','postgresql')
+    dbstring=dbstring or _DBSTRING
+    if dbstring is None: raise KeyError('DATAVACUUM_DBSTRING')
+    connection_info=_parse_dbstring(dbstring)
+    connection_info['Driver']=_DRIVER or 'postgresql'
     connection_info['sslargs']={'sslrootcert':sslrootcert,'sslmode':'verify-full'} \
         if (sslrootcert:=get_ssl_rootcert_for_db()) is not None else {}
     return connection_info
 
+@cache
 def get_ssl_rootcert_for_db() -> Optional[None]:
     """Returns the path to the SSL root certificate
 
     If a replacement function is designated in the configuration (database.credentials.get_ssl_rootcert_for_db),
     it will be called.  Otherwise, the environment variable DATAVACUUM_SSLROOTCERT will be used.
+    The result is cached for the life of the process.
 
     Returns:
         Optional[None]: The path to the SSL root certificate, or None if not found
     """
-    try:
-        dotpath=CONFIG['database']['credentials']['get_ssl_rootcert_for_db']
-    except KeyError:
-        logger.debug("No database.credentials.get_ssl_rootcert_for_db configured, falling back on environment")
-        pth=os.environ.get('DATAVACUUM_SSLROOTCERT',None)
-    else:
-        pth=import_modfunc(dotpath)()
+    if _SSL_ROOTCERT_PROVIDER is None: _init_providers()
+    pth=_SSL_ROOTCERT_PROVIDER()
+    # Since this function is cached, the existence check (a stat call) only happens on the first call
     if pth is not None: assert Path(pth).exists(), f"SSL root certificate not found at {pth}"
     return pth
 
+def _refresh_environment():
+    """Re-reads the database environment variables and clears the cached connection info.
+
+    Only needed if the DATAVACUUM_DBSTRING, DATAVACUUM_DB_DRIVERNAME or DATAVACUUM_SSLROOTCERT environment variables
+    are changed after this module is imported (eg by tests).
+    """
+    global _DBSTRING, _DRIVER, _SSLROOT
+    _DBSTRING=os.environ.get('DATAVACUUM_DBSTRING')
+    _DRIVER=os.environ.get('DATAVACUUM_DB_DRIVERNAME')
+    _SSLROOT=os.environ.get('DATAVACUUM_SSLROOTCERT')
+    get_db_connection_info.cache_clear()
+    get_ssl_rootcert_for_db.cache_clear()
+
 def get_access_key_sign_seed() -> bytes:
     """Returns the seed for signing access keys
 
@@ -70,13 +135,11 @@ def get_access_key_sign_seed() -> bytes:
     Returns:
         bytes: The seed for signing access keys
     """
-    try:
-        dotpath=CONFIG['database']['credentials']['get_access_key_sign_seed']
-    except KeyError:
+    if (dotpath:=_get_credentials_config().get('get_access_key_sign_seed')) is None:
         logger.debug("No database.credentials.get_access_key_sign_seed configured, falling back on environment")
         seed=os.environ['DATAVACUUM_SIGN_SEED'].encode()
     else:
-        seed=import_modfunc(dotpath)()
+        seed=_resolve_modfunc(dotpath)()
     return seed
 
 @cache
@@ -88,4 +151,4 @@ def get_auth_info() -> dict:
         for k,v in os.environ.items():
             if 'DATAVAC' in k: f=f.replace(f"%{k}%",v)
         theyaml=safe_load(f)
-    return import_modfunc(theyaml['authentication']['get_auth_info'])()
+    return _resolve_modfunc(theyaml['authentication']['get_auth_info'])()
@@ -1,26 +1,34 @@
 import argparse
 import functools
+import hashlib
 import os
 import pickle
 import sys
+import tempfile
 import traceback
+import zlib
+from concurrent.futures import ThreadPoolExecutor, Future
 from contextlib import contextmanager
 from datetime import datetime
 import time
 from pathlib import Path
-from typing import Union, Callable, Optional
+from urllib.parse import quote
+from typing import Union, Callable, Optional, Any
+from types import SimpleNamespace
 
-import requests
+from sqlalchemy import __version__ as sqlalchemy_version
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import SQLAlchemyError
 
 from datavac.appserve.dvsecrets import get_db_connection_info
 from datavac.io.layout_params import get_layout_params
+from datavac.io.measurement_table import UniformMeasurementTable
 from datavac.io.meta_reader import ensure_meas_group_sufficiency, ALL_MATERIAL_COLUMNS, ALL_LOAD_COLUMNS, \
     ALL_MATLOAD_COLUMNS
-from datavac.io.postgresql_binary_format import df_to_pgbin, pd_to_pg_converters
+from datavac.io.postgresql_binary_format import df_to_pgbin, pd_to_pg_converters, sweeps_to_pgbin
 from sqlalchemy import text, Engine, create_engine, ForeignKey, UniqueConstraint, PrimaryKeyConstraint, \
-    ForeignKeyConstraint, DOUBLE_PRECISION, delete, select, literal, union_all, insert, Connection, label, join
+    ForeignKeyConstraint, DOUBLE_PRECISION, delete, select, literal, union_all, insert, Connection, label, join, \
+    bindparam, and_, Join, func, tuple_
 from sqlalchemy.dialects.postgresql import insert as pgsql_insert, BYTEA, TIMESTAMP
 from sqlalchemy import INTEGER, VARCHAR, BOOLEAN, Column, Table, MetaData
 import numpy as np
@@ -36,6 +44,41 @@ from datavac.util.util import returner_context, import_modfunc
 
 _CASC=dict(onupdate='CASCADE',ondelete='CASCADE')
 
+# Optional (see the 'adbc' extra): reads via ADBC fetch with binary COPY straight into Arrow
+try: import adbc_driver_postgresql.dbapi as pg_adbc
+except ImportError: pg_adbc=None
+
+# Mask info is stored as zlib-compressed pickle behind this (versioned) prefix.
+# Blobs without the prefix are plain pickles from before compression was added.
+_MASK_INFO_PREFIX=b'DVZ1'
+def _pack_mask_info(obj) -> bytes:
+    return _MASK_INFO_PREFIX+zlib.compress(pickle.dumps(obj),level=6)
+def _unpack_mask_info(blob:bytes):
+    blob=bytes(blob)
+    if blob.startswith(_MASK_INFO_PREFIX):
+        blob=zlib.decompress(blob[len(_MASK_INFO_PREFIX):])
+    return pickle.loads(blob)
+
+_diemaps={}
+def _generate_diemap(generator, args):
+    """Calls the array_map generator (memoized for the process, since the same config gives the same diemap)"""
+    key=(generator,repr(sorted(args.items())))
+    if key not in _diemaps:
+        _diemaps[key]=import_modfunc(generator)(**args)
+    return _diemaps[key]
+
+def _dies_columns() -> list:
+    """Fresh Columns (and constraints) for the Dies table"""
+    return [Column('dieid',INTEGER,autoincrement=True,nullable=False,primary_key=True),
+            Column('Mask',VARCHAR,ForeignKey("Masks.Mask",**_CASC),nullable=False,index=True),
+            Column('DieXY',VARCHAR,nullable=False,index=True),
+            Column('DieRadius [mm]',INTEGER,nullable=False),
+            Column('DieCenterA [mm]',DOUBLE_PRECISION,nullable=False),
+            Column('DieCenterB [mm]',DOUBLE_PRECISION,nullable=False),
+            Column('DieX',INTEGER,nullable=False),
+            Column('DieY',INTEGER,nullable=False),
+            UniqueConstraint('Mask','DieXY')]
+
 _database:'PostgreSQLDatabase'=None
 def get_database(metadata_source:Optional[str]=None,populate_metadata:bool=True) -> 'PostgreSQLDatabase':
     """ Returns a singleton PostgreSQLDatabase object
@@ -82,10 +125,15 @@ class Database:
 class AlchemyDatabase:
 
     engine:  Engine
-    _metadata: MetaData
 
     def __init__(self, metadata_source='yaml'):
         self._populated_metadata=False
+        self._metadata_future:Optional[Future]=None
+        self._statement_cache={}
+        self._mask_info_cache={}
+        self._diem_cache:dict[str,dict[str,int]]={}
+        self._table_cache={}
+        self._table_sigs={}
         self._metadata_source=metadata_source
         assert self._metadata_source in ['yaml','reflect']
         with time_it("Initializing Database",threshold_time=.1):
@@ -126,22 +174,103 @@ class AlchemyDatabase:
             port=int(connection_info['Port']),
             database=connection_info['Database'],
         )
-        self.engine=create_engine(url, connect_args=connection_info['sslargs'], pool_recycle=60)
+        # TCP keepalives and pre-ping so idle pooled connections survive (or are detected as dead before use)
+        # With psycopg (3), have repeated parameterized queries become server-side prepared statements
+        # (psycopg2, the default 'postgresql' driver, has no equivalent option)
+        prepare_args={'prepare_threshold':1} if connection_info['Driver'].endswith('+psycopg') else {}
+        self.engine=create_engine(url,
+                                  connect_args={**connection_info['sslargs'],**prepare_args,
+                                                'keepalives':1,'keepalives_idle':30,
+                                                'keepalives_interval':10,'keepalives_count':5},
+                                  pool_size=int(os.environ.get('DATAVACUUM_POOL_SIZE',20)), max_overflow=10,
+                                  pool_pre_ping=True,
+                                  pool_recycle=int(os.environ.get('DATAVACUUM_POOL_RECYCLE',1800)))
+        # libpq-style URI for connections made outside SQLAlchemy (ie ADBC reads)
+        # (query values are %-quoted by hand since libpq, unlike URL, doesn't read '+' as a space)
+        self._libpq_uri=url.set(drivername='postgresql').render_as_string(hide_password=False)+\
+            "".join(f"{'&' if i else '?'}{k}={quote(str(v),safe='')}"
+                    for i,(k,v) in enumerate(connection_info['sslargs'].items()))
 
     def establish_schema_and_blob_store(self, conn, on_mismatch='raise', just_metadata=False): raise NotImplementedError
     def get_obj(self,name): raise NotImplementedError
     def store_obj(self,name,obj,conn=None): raise NotImplementedError
 
+    @property
+    def _metadata(self) -> MetaData:
+        # If reflection is running in the background, wait for it on first access
+        if self._metadata_future is not None:
+            self._metadata=self._metadata_future.result()
+        return self._metadata_value
+    @_metadata.setter
+    def _metadata(self, metadata: MetaData):
+        self._metadata_future=None
+        self._metadata_value=metadata
+        self._table_cache.clear()
+
     def _init_metadata(self, reflect=False):
-        self._metadata = MetaData(schema=CONFIG['database']['schema_names']['internal'])
         if reflect:
-            with time_it("Reflecting",threshold_time=.1):
-                with self.engine_connect() as conn:
-                    self._metadata.reflect(conn)
+            # Reflection is I/O-bound, so it runs on a background thread (with its own connection)
+            # while the caller continues; the first access of self._metadata waits for the result
+            executor=ThreadPoolExecutor(1,thread_name_prefix='reflect')
+            self._metadata_future=executor.submit(self._reflect_with_cache)
+            executor.shutdown(wait=False)
             self._populated_metadata=True
         else:
+            self._metadata = MetaData(schema=CONFIG['database']['schema_names']['internal'])
             self.establish_schema_and_blob_store(conn=None, just_metadata=True)
 
+    def _reflect_with_cache(self) -> MetaData:
+        """ Reflects the database into a new MetaData, re-using a locally cached reflection if possible.
+
+        The cache is keyed by a hash of the internal schema's column types (with length/precision), defaults,
+        constraint definitions and index definitions (one quick catalog query), so any change to the tables in
+        the database leads to a fresh reflection.  Older cached reflections of the schema are pruned.
+        """
+        with time_it("Reflecting",threshold_time=.1), self.engine_connect() as conn:
+            schema_hash=conn.execute(text(
+                "SELECT md5("
+                  "coalesce((SELECT string_agg(c.relname||'.'||a.attname||':'||format_type(a.atttypid,a.atttypmod)"
+                                    "||':'||a.attnotnull::text||':'||coalesce(pg_get_expr(d.adbin,d.adrelid),''),"
+                                    "',' ORDER BY c.relname, a.attnum)"
+                            " FROM pg_attribute a JOIN pg_class c ON c.oid=a.attrelid"
+                            " JOIN pg_namespace n ON n.oid=c.relnamespace"
+                            " LEFT JOIN pg_attrdef d ON d.adrelid=a.attrelid AND d.adnum=a.attnum"
+                            " WHERE n.nspname=:schema AND c.relkind IN ('r','p','v','m','f')"
+                            " AND a.attnum>0 AND NOT a.attisdropped),'')"
+                  "||'|'||coalesce((SELECT string_agg(c.relname||'.'||k.conname||':'||pg_get_constraintdef(k.oid),"
+                                    "',' ORDER BY c.relname, k.conname)"
+                            " FROM pg_constraint k JOIN pg_class c ON c.oid=k.conrelid"
+                            " JOIN pg_namespace n ON n.oid=k.connamespace WHERE n.nspname=:schema),'')"
+                  "||'|'||coalesce((SELECT string_agg(tablename||'.'||indexname||':'||indexdef,"
+                                    "',' ORDER BY tablename, indexname)"
+                            " FROM pg_indexes WHERE schemaname=:schema),''));"),
+                {'schema':self.int_schema}).scalar_one()
+            cfile=USER_CACHE/"reflection"/f"{self.int_schema}-{sqlalchemy_version}-{schema_hash}.pkl"
+            try:
+                with open(cfile,'rb') as f:
+                    return pickle.load(f)
+            except Exception as e:
+                logger.debug(f"Couldn't use cached reflection, will reflect: {str(e)}")
+            metadata=MetaData(schema=self.int_schema)
+            metadata.reflect(conn)
+            cfile.parent.mkdir(exist_ok=True)
+            # Written to a temp file then moved into place, so another process never reads a partial pickle
+            tmpname=None
+            try:
+                with tempfile.NamedTemporaryFile('wb',dir=cfile.parent,suffix='.tmp',delete=False) as f:
+                    tmpname=f.name
+                    pickle.dump(metadata,f)
+                os.replace(tmpname,cfile)
+            except Exception as e:
+                logger.debug(f"Couldn't cache reflection: {str(e)}")
+                if tmpname is not None: Path(tmpname).unlink(missing_ok=True)
+            # Reflections for previous versions of the schema won't be used again
+            for old in cfile.parent.glob(f"{self.int_schema}-*.pkl"):
+                if old==cfile: continue
+                try: old.unlink(missing_ok=True)
+                except OSError as e: logger.debug(f"Couldn't remove old cached reflection {old.name}: {str(e)}")
+            return metadata
+
     def clear_database(self, only_tables=None, schema_also=False, conn=None):
         removed_tables=[]
         with (returner_context(conn) if conn else self.engine_begin()) as conn:
@@ -156,39 +285,89 @@ class AlchemyDatabase:
                     conn.execute(text(f'DROP TABLE {table.schema}."{table.name}" CASCADE;'))
                     removed_tables.append(table)
                     self._metadata.remove(table)
+                self._table_cache.clear()
+                self._diem_cache.clear()
                 if only_tables:
                     assert list(sorted([(t.schema,t.name) for t in removed_tables]))==\
                            list(sorted([(t.schema,t.name) for t in only_tables])),\
                         f"Trouble removing {[t.name for t in only_tables]}"
 
+    def _cached_statement(self, key, make_statement: Callable):
+        """ Returns the statement made by make_statement(), reusing it on later calls with the same key.
+
+        The key should include every Table involved in the statement, so that if a table is re-created,
+        a new statement is made against the new Table object.
+        """
+        if (stmt:=self._statement_cache.get(key,None)) is None:
+            stmt=self._statement_cache[key]=make_statement()
+        return stmt
+
+    def _table(self, name) -> Optional[Table]:
+        """ Looks up an internal-schema table by name, memoized until the tables in self._metadata change."""
+        try: return self._table_cache[name]
+        except KeyError:
+            tab=self._table_cache[name]=self._metadata.tables.get(f"{self.int_schema}.{name}",None)
+            return tab
+
+    def _onclauses(self, coretab:Table, layotab:Optional[Table]=None,
+                   loadid_col:Optional[Column]=None) -> dict[Table,Any]:
+        """ Explicit join conditions linking coretab (a Meas or Analysis table) to the Loads, Materials,
+        Dies and (if given) Layout tables.  loadid_col overrides which column of coretab refers to Loads."""
+        loadtab,mattab,diemtab=self._loadtab,self._mattab,self._diemtab
+        ons={loadtab:((loadid_col if loadid_col is not None else coretab.c.loadid)==loadtab.c.loadid),
+             mattab:(loadtab.c.matid==mattab.c.matid)}
+        if 'dieid' in coretab.c: ons[diemtab]=(coretab.c.dieid==diemtab.c.dieid)
+        if layotab is not None and 'Structure' in coretab.c: ons[layotab]=(coretab.c.Structure==layotab.c.Structure)
+        return ons
+
+    def _explicit_join(self, tables:list[Table], onclauses:dict[Table,Any]) -> Join:
+        """ Joins tables in order, each on its entry in onclauses, reusing the Join for the same tables."""
+        return self._cached_statement(('join',*tables),lambda: functools.reduce(
+            (lambda x,y: x.join(y,onclause=onclauses.get(y,None))),tables[1:],tables[0]))
+
+    def _full_join_for_meas(self, meas_group, include_sweeps=False, raw_only=False) -> tuple[list[Table],Join]:
+        """ Returns the tables involved in reading meas_group and the Join of them."""
+        meastab=self._mgt(meas_group,'meas')
+        sweptab=self._mgt(meas_group,'sweep') if include_sweeps else None
+        extrtab=self._mgt(meas_group,'extr') if not raw_only else None
+        layotab=self._mgt(meas_group,'layout')
+        diemtab=self._diemtab if CONFIG['measurement_groups'][meas_group].get('connect_to_die_table',True) else None
+        involved_tables=[t for t in [extrtab,meastab,diemtab,layotab,self._loadtab,self._mattab,sweptab]
+                            if t is not None]
+        ons=self._onclauses(meastab,layotab)
+        on_meas=lambda t: and_(t.c.loadid==meastab.c.loadid,t.c.measid==meastab.c.measid)
+        if extrtab is not None: ons[meastab]=on_meas(extrtab)
+        if sweptab is not None: ons[sweptab]=on_meas(sweptab)
+        return involved_tables, self._explicit_join(involved_tables,ons)
+
     @property
     def int_schema(self):
         return CONFIG['database']['schema_names']['internal']
     @property
     def _mattab(self) -> Table:
-        return self._metadata.tables[f"{self.int_schema}.Materials"]
+        return self._table("Materials")
     @property
     def _loadtab(self) -> Table:
-        return self._metadata.tables[f"{self.int_schema}.Loads"]
+        return self._table("Loads")
     @property
     def _rextab(self) -> Table:
-        return self._metadata.tables[f"{self.int_schema}.ReExtract"]
+        return self._table("ReExtract")
     @property
     def _reatab(self) -> Table:
-        return self._metadata.tables[f"{self.int_schema}.ReAnalyze"]
+        return self._table("ReAnalyze")
     @property
     def _masktab(self) -> Table:
-        return self._metadata.tables[f"{self.int_schema}.Masks"]
+        return self._table("Masks")
     @property
     def _diemtab(self) -> Table:
-        return self._metadata.tables[f"{self.int_schema}.Dies"]
+        return self._table("Dies")
     def _mgt(self,mg,wh) -> Table:
-        return self._metadata.tables.get(f"{self.int_schema}.{wh.capitalize()} -- {mg}",None)
+        return self._table(f"{wh.capitalize()} -- {mg}")
     def _hat(self,an) -> Table:
-        return self._metadata.tables.get(f"{self.int_schema}.Analysis -- {an}",None)
+        return self._table(f"Analysis -- {an}")
     @property
     def _blobtab(self) -> Table:
-        return self._metadata.tables.get(f"{self.int_schema}.Blob Store")
+        return self._table("Blob Store")
 
 
         #@staticmethod
@@ -220,6 +399,33 @@ class PostgreSQLDatabase(AlchemyDatabase):
         DOUBLE_PRECISION:'float64',
         TIMESTAMP:'datetime64[ns]'
     }
+    read_chunksize=50_000
+    # Whether to read large results via ADBC (needs the 'adbc' extra) rather than through psycopg2 and pd.read_sql
+    read_with_adbc=os.environ.get('DATAVACUUM_READ_WITH_ADBC','0')=='1'
+
+    def _read_sql(self, sel, conn, selcols=()) -> pd.DataFrame:
+        """ pd.read_sql of sel with dtypes from selcols, streamed from a server-side cursor in chunks
+        so the whole raw result set is never buffered at once alongside the DataFrame."""
+        dtype={c.name:self.sql_to_pd_types[c.type.__class__] for c in selcols
+               if c.type.__class__ in self.sql_to_pd_types}
+        if isinstance(sel,str): return pd.read_sql(sel,conn,dtype=dtype)
+        # ADBC reads on its own connection, so only when conn has no transaction whose changes it should see
+        if self.read_with_adbc and pg_adbc is not None and not conn.in_transaction():
+            return self._read_sql_adbc(sel,dtype)
+        chunks=list(pd.read_sql(sel.execution_options(stream_results=True,yield_per=self.read_chunksize),conn,
+                                chunksize=self.read_chunksize,dtype=dtype))
+        return chunks[0] if len(chunks)==1 else pd.concat(chunks,ignore_index=True)
+
+    def _read_sql_adbc(self, sel, dtype={}) -> pd.DataFrame:
+        """ Reads sel via ADBC (binary COPY into an Arrow table) and converts to pandas with the given dtypes."""
+        compiled=sel.compile(dialect=postgresql.dialect(paramstyle='numeric_dollar'),
+                             compile_kwargs={'render_postcompile':True})
+        params=[compiled.params[k] for k in compiled.positiontup]
+        with pg_adbc.connect(self._libpq_uri) as aconn:
+            with aconn.cursor() as cur:
+                cur.execute(compiled.string,params if len(params) else None)
+                data=cur.fetch_arrow_table().to_pandas()
+        return data.astype(dtype) if len(dtype) else data
 
 
     def clear_excess_tables(self, conn, on_mismatch='raise',check_for_wasteful_layout_tables=False):
@@ -340,41 +546,44 @@ class PostgreSQLDatabase(AlchemyDatabase):
                         continue
                     self.establish_layout_parameters(layout_params,mgoa,conn,on_mismatch=on_mismatch,just_metadata=just_metadata)
                     if not just_metadata: conn.commit()
+            # All the measurement group and analysis DDL goes in one transaction each, rather than a commit per group,
+            # and the view (re)creations for all groups are sent together in one round-trip at the end of each
+            view_sqls=[]
             with time_it("Ensuring measurement group tables",threshold_time=.1):
                 for mg in CONFIG['measurement_groups']:
-                    self.establish_measurement_group_tables(mg,conn,on_mismatch=on_mismatch,just_metadata=just_metadata)
-                    if not just_metadata: conn.commit()
+                    self.establish_measurement_group_tables(mg,conn,on_mismatch=on_mismatch,just_metadata=just_metadata,
+                                                            view_sqls=view_sqls)
+                if len(view_sqls): conn.execute(text(" ".join(view_sqls))); view_sqls.clear()
+                if not just_metadata: conn.commit()
             with time_it("Ensuring higher_analyses tables",threshold_time=.1):
                 for an in CONFIG['higher_analyses']:
-                    self.establish_higher_analysis_tables(an,conn,on_mismatch=on_mismatch,just_metadata=just_metadata)
-                    if not just_metadata: conn.commit()
+                    self.establish_higher_analysis_tables(an,conn,on_mismatch=on_mismatch,just_metadata=just_metadata,
+                                                          view_sqls=view_sqls)
+                if len(view_sqls): conn.execute(text(" ".join(view_sqls))); view_sqls.clear()
+                if not just_metadata: conn.commit()
         self._established=True
 
     def establish_mask_tables(self,conn, on_mismatch='raise',just_metadata=False):
-        needs_update=False
+        needs_update,dies_created=False,False
         def yes_needs_update():
             nonlocal needs_update
             needs_update=True
+        def dies_init():
+            nonlocal needs_update, dies_created
+            needs_update,dies_created=True,True
         self._ensure_table_exists(conn,self.int_schema,f'Masks',
                           Column('Mask',VARCHAR,nullable=False,unique=True,primary_key=True),
                           Column('info_pickle',BYTEA,nullable=False),
                           on_mismatch=on_mismatch,on_init=yes_needs_update,just_metadata=just_metadata)
-        self._ensure_table_exists(conn,self.int_schema,f'Dies',
-                          Column('dieid',INTEGER,autoincrement=True,nullable=False,primary_key=True),
-                          Column('Mask',VARCHAR,ForeignKey("Masks.Mask",**_CASC),nullable=False,index=True),
-                          Column('DieXY',VARCHAR,nullable=False,index=True),
-                          Column('DieRadius [mm]',INTEGER,nullable=False),
-                          Column('DieCenterA [mm]',DOUBLE_PRECISION,nullable=False),
-                          Column('DieCenterB [mm]',DOUBLE_PRECISION,nullable=False),
-                          Column('DieX',INTEGER,nullable=False),
-                          Column('DieY',INTEGER,nullable=False),
-                          UniqueConstraint('Mask','DieXY'),
-                          on_mismatch=on_mismatch,on_init=yes_needs_update,just_metadata=just_metadata)
+        self._ensure_table_exists(conn,self.int_schema,f'Dies',*_dies_columns(),
+                          on_mismatch=on_mismatch,on_init=dies_init,just_metadata=just_metadata)
         if needs_update:
-            self.update_mask_info(conn)
+            self.update_mask_info(conn,initial_load=dies_created)
 
     def fix_die_constraint(self,conn,add_or_remove='add'):
         #tab=self._mgt(mg,'Meas').name
+        # Ask the DB which tables have the constraint, rather than trusting the metadata,
+        # since the constraint may have been dropped (see 'remove' below) while the metadata still lists it
         res=conn.execute(
             text("SELECT table_name FROM information_schema.table_constraints"
                  f" WHERE table_schema='{self.int_schema}' AND "
@@ -390,53 +599,73 @@ class PostgreSQLDatabase(AlchemyDatabase):
                 if tab.name not in constrained_tabs:
                     unconstrained_tabs.append(tab.name)
         if add_or_remove=='add':
-            for tab in unconstrained_tabs:
-                if 'dieid' in [c.name for c in self._metadata.tables[self.int_schema+'.'+tab].columns]:
-                    conn.execute(text(f'ALTER TABLE {self.int_schema}."{tab}"' \
-                                      f' ADD CONSTRAINT "fk_dieid" FOREIGN KEY ("dieid")' \
-                                      f' REFERENCES {self.int_schema}."Dies" ("dieid") ON DELETE CASCADE;'))
+            ddls=[f'ALTER TABLE {self.int_schema}."{tab}"' \
+                  f' ADD CONSTRAINT "fk_dieid" FOREIGN KEY ("dieid")' \
+                  f' REFERENCES {self.int_schema}."Dies" ("dieid") ON DELETE CASCADE;'
+                  for tab in unconstrained_tabs if 'dieid' in self._table(tab).c]
         elif add_or_remove=='remove':
-            for tab in constrained_tabs:
-                if 'dieid' in [c.name for c in self._metadata.tables[self.int_schema+'.'+tab].columns]:
-                    conn.execute(text(f'ALTER TABLE {self.int_schema}."{tab}"' \
-                                      f' DROP CONSTRAINT "fk_dieid";'))
+            ddls=[f'ALTER TABLE {self.int_schema}."{tab}" DROP CONSTRAINT "fk_dieid";'
+                  for tab in constrained_tabs if 'dieid' in self._table(tab).c]
         else: raise ValueError(f"What is '{add_or_remove}'? Was expecting 'add' or 'remove'.")
+        # All the ALTERs in one round-trip
+        if len(ddls): conn.execute(text(" ".join(ddls)))
+
+    def update_mask_info(self,conn,initial_load=False):
+        """ Updates the Masks and Dies tables from the array_maps in the config.
 
-    def update_mask_info(self,conn):
+        initial_load should only be set if the Dies table was created in the current transaction.
+        """
         #previous_masktab=pd.read_sql(select(*self._masktab.columns),conn)
         #######Column('Mask',VARCHAR,ForeignKey("Masks.Mask",name='fk_mask',**_CASC),nullable=False),
         diemdf=[]
+        mask_rows=[]
         for mask,info in CONFIG['array_maps'].items():
-            dbdf,to_pickle=import_modfunc(info['generator'])(**info['args'])
+            dbdf,to_pickle=_generate_diemap(info['generator'],info['args'])
             diemdf.append(dbdf.assign(Mask=mask)[['Mask','DieXY','DieRadius [mm]','DieCenterA [mm]','DieCenterB [mm]','DieX','DieY']])
-            update_info=dict(Mask=mask,info_pickle=pickle.dumps(to_pickle))
-            conn.execute(pgsql_insert(self._masktab).values(**update_info)\
-                         .on_conflict_do_update(index_elements=['Mask'],set_=update_info))
-
-        diemdf=pd.concat(diemdf).reset_index(drop=True).reset_index(drop=False)
-        previous_dietab=pd.read_sql(select(*self._diemtab.columns).order_by(self._diemtab.c['dieid']),conn).reset_index(drop=False)
-        # This checks that nothing has changed in the previous table
-        # very important to check that because all the measured data is only associated with a die index,
-        # so if we accidentally change the die index, even by uploading the tables in a different order...
-        # poof all the old data is now associated with the wrong dies or even wrong masks!!
-        print("\n\n\nPREVIOUS:")
-        print(previous_dietab)
-        print("\n\n\nNEW:")
-        print(diemdf)
-        print("\n")
-        assert len(previous_dietab.merge(diemdf))==len(previous_dietab),\
-            "Can't add to die tables without messing up existing dies"
-        self._upload_csv(diemdf.iloc[len(previous_dietab):],conn,self.int_schema,'Dies')
+            mask_rows.append(dict(Mask=mask,info_pickle=_pack_mask_info(to_pickle)))
+        if len(mask_rows):
+            stmt=pgsql_insert(self._masktab).values(mask_rows)
+            conn.execute(stmt.on_conflict_do_update(index_elements=['Mask'],
+                                                    set_={'info_pickle':stmt.excluded.info_pickle}))
+            self._mask_info_cache.clear()
+
+        # The array_map generators' dtypes aren't enforced (eg float radii), and binary COPY won't convert them
+        diemdf=self._cast_for_table(pd.concat(diemdf).reset_index(drop=True).reset_index(drop=False),self._diemtab)
+        self._diem_cache.clear()
+        if initial_load:
+            self._upload_binary(diemdf,conn,self.int_schema,'Dies',initial_load=True)
+        else:
+            # This checks that nothing has changed in the previous table
+            # very important to check that because all the measured data is only associated with a die index,
+            # so if we accidentally change the die index, even by uploading the tables in a different order...
+            # poof all the old data is now associated with the wrong dies or even wrong masks!!
+            # The comparison is done server-side against a temp table so the Dies table never has to be downloaded
+            conn.execute(text(f'CREATE TEMP TABLE tmpdie (LIKE {self.int_schema}."Dies");'))
+            self._upload_binary(diemdf,conn,None,'tmpdie')
+            using=",".join(f'"{c.name}"' for c in self._diemtab.columns)
+            assert conn.execute(text(
+                f'SELECT (SELECT count(*) FROM tmpdie JOIN {self.int_schema}."Dies" USING ({using}))'
+                f'     = (SELECT count(*) FROM {self.int_schema}."Dies");')).scalar_one(),\
+                "Can't add to die tables without messing up existing dies"
+            conn.execute(text(f'INSERT INTO {self.int_schema}."Dies" SELECT * FROM tmpdie'
+                              f' WHERE dieid >= (SELECT count(*) FROM {self.int_schema}."Dies");'))
+            conn.execute(text(f'DROP TABLE tmpdie;'))
 
         self.fix_die_constraint(conn,add_or_remove='add')
         print("Successful")
 
     def get_mask_info(self,mask,conn=None):
-        with (returner_context(conn) if conn else self.engine_connect()) as conn:
-            res=conn.execute(select(self._masktab.c.info_pickle).where(self._masktab.c.Mask==mask)).all()
-        assert len(res)==1, f"Couldn't get info from database about mask {mask}"
-        # Must ensure restricted write access to DB since this allows arbitrary code execution
-        return pickle.loads(res[0][0])
+        """Returns the unpickled info for mask (cached in-process, since it only changes with update_mask_info)"""
+        if mask not in self._mask_info_cache:
+            with (returner_context(conn) if conn else self.engine_connect()) as conn:
+                masktab=self._masktab
+                res=conn.execute(self._cached_statement(('get_mask_info',masktab),
+                                    lambda: select(masktab.c.info_pickle).where(masktab.c.Mask==bindparam('mask'))),
+                                 {'mask':mask}).all()
+            assert len(res)==1, f"Couldn't get info from database about mask {mask}"
+            # Must ensure restricted write access to DB since this allows arbitrary code execution
+            self._mask_info_cache[mask]=_unpack_mask_info(res[0][0])
+        return self._mask_info_cache[mask]
 
     def establish_layout_parameters(self,layout_params, measurement_group, conn, on_mismatch='raise',just_metadata=False):
         mg, df=measurement_group, layout_params._tables_by_meas[measurement_group]
@@ -454,7 +683,7 @@ class PostgreSQLDatabase(AlchemyDatabase):
                                   f'DROP CONSTRAINT IF EXISTS "fk_struct -- {mg}";'))
             self.clear_database(only_tables=[tabname],conn=conn)
         def initialize_callback():
-            self.update_layout_parameters(layout_params,mg,conn)
+            self.update_layout_parameters(layout_params,mg,conn,initial_load=True)
 
         with time_it(f"Ensuring layout params for {mg}",threshold_time=.005):
             cols=[Column('Structure',VARCHAR,primary_key=True),
@@ -463,96 +692,153 @@ class PostgreSQLDatabase(AlchemyDatabase):
                                   on_mismatch=on_mismatch, on_init=initialize_callback, just_metadata=just_metadata)
 
 
-    def _upload_binary(self, df, conn, schema, table, override_converters={}):
+    # The pandas dtype each column type is encoded from for binary COPY (which, unlike text COPY, won't convert)
+    upload_pd_types={
+        INTEGER:'Int32',
+        VARCHAR:'string',
+        BOOLEAN:'boolean',
+        DOUBLE_PRECISION:'float64',
+        TIMESTAMP:'datetime64[ns]'
+    }
+    def _cast_for_table(self, df, tab: Table) -> pd.DataFrame:
+        """ df with each column whose dtype wouldn't encode as its column type in tab (eg an int64 extraction going
+        into a DOUBLE PRECISION column) cast to a dtype that does."""
+        casts={c:self.upload_pd_types[sqltype] for c,dtype in df.dtypes.items()
+               if c in tab.c and (sqltype:=tab.c[c].type.__class__) in self.upload_pd_types
+               and self.pd_to_sql_types.get(str(dtype),None) is not sqltype
+               and not (sqltype is VARCHAR and dtype==object)}
+        return df.astype(casts) if len(casts) else df
+
+    def _upload_binary(self, df, conn, schema, table, override_converters={}, initial_load=False, cast_to=None):
+        """ COPY's df into the table.
+
+        initial_load should only be set if the table was created (or truncated) in the current transaction,
+        in which case the rows are written already frozen, saving a later VACUUM pass over them.
+        If cast_to (a Table) is given, df's columns are first cast to match its column types (see _cast_for_table).
+        """
+        if cast_to is not None: df=self._cast_for_table(df,cast_to)
         with time_it(f"Conversion to binary for {table}",.1):
             bio=df_to_pgbin(df, override_converters=override_converters)
             #print("BIO len:",len(bio.read()))
             #bio.seek(0)
             #print(bio.read().hex())
             #bio.seek(0)
+        self._upload_pgbin(bio, conn, schema, table, initial_load=initial_load)
 
+    def _upload_pgbin(self, bio, conn, schema, table, initial_load=False):
+        """ COPY's already-encoded binary data (see postgresql_binary_format) into the table."""
         with time_it(f"Upload of binary for {table}",.1):
             with conn.connection.cursor() as cur:
-                cur.copy_expert(f'COPY {schema}."{table}" FROM STDIN BINARY',bio)
+                cur.copy_expert(f'COPY {schema+"." if schema else ""}"{table}" FROM STDIN BINARY'
+                                +(' FREEZE' if initial_load else ''),bio)
         ##### TEMPORARILY REMOVING DB-API COMMIT
         #conn.connection.commit()
 
-    def _upload_csv(self, df, conn, schema, table):
-        with time_it(f"Conversion to csv for {table}",.1):
-            output = io.StringIO()
-            df.replace([np.inf,-np.inf],np.nan).to_csv(output, sep='|', header=False, index=False)
-            #print("CSV len",len(output.getvalue().encode('utf-8')))
-            #output.seek(0)
-            #print(output.read())
-            output.seek(0)
-        with time_it(f"Upload of csv for {table}",.1):
-            with conn.connection.cursor() as cur:
-                try:
-                    cur.copy_expert(f'COPY {schema+"." if schema else ""}"{table}" FROM STDIN WITH DELIMITER \'|\' NULL \'\'',file=output)
-                except Exception as e:
-                    import pdb; pdb.set_trace()
-                    raise
-        ##### TEMPORARILY REMOVING DB-API COMMIT
-        # conn.connection.commit()
-
-    def dump_extractions(self, measurement_group, conn):
-        if measurement_group not in CONFIG.measurement_groups: raise ValueError(f"Unknown group '{measurement_group}'")
-        if (extr_tab:=self._mgt(measurement_group,'extr')) is None: return
-        if (meas_tab:=self._mgt(measurement_group,'meas')) is None: return
-        fullname=CONFIG['database']['materials']['full_name']
-        conn.execute(
-            pgsql_insert(self._rextab)\
-                .from_select(["matid","MeasGroup",'full_reload',*ALL_LOAD_COLUMNS],
-                    select(self._loadtab.c.matid,literal(measurement_group),literal(False),*[self._loadtab.c[c] for c in ALL_LOAD_COLUMNS]) \
-                    .select_from(extr_tab.join(meas_tab).join(self._loadtab))\
-                           .distinct())\
-                .on_conflict_do_nothing())
-        conn.execute(delete(extr_tab))
-
-    def dump_measurements(self, measurement_group, conn):
-        if measurement_group not in CONFIG.measurement_groups: raise ValueError(f"Unknown group '{measurement_group}'")
-        try:
-            meas_tab=self._mgt(measurement_group,'meas')
-        except KeyError:
-            return
-        if meas_tab is not None:
-            #raise Exception("Should this say on_conflict_do_update in case the conflict is with a previous re-extraction request?")
-            conn.execute(
-                pgsql_insert(self._rextab) \
-                    .from_select(["matid","MeasGroup",'full_reload',*ALL_LOAD_COLUMNS],
-                                 select(self._loadtab.c.matid,literal(measurement_group),literal(True),*[self._loadtab.c[c] for c in ALL_LOAD_COLUMNS]) \
-                                 .select_from(meas_tab.join(self._loadtab)) \
-                                 .distinct()) \
-                    .on_conflict_do_nothing())
-            conn.execute(delete(meas_tab))
-
-    def dump_higher_analysis(self, analysis, conn):
-        if analysis not in CONFIG.higher_analyses: raise ValueError(f"Unknown analysis '{analysis}'")
-        if (an_tab:=self._hat(analysis)) is None: return
-        mg=list(CONFIG.higher_analyses[analysis]['required_dependencies'])[0]
-        conn.execute(
-            pgsql_insert(self._reatab) \
-                .from_select(["matid","analysis"],
-                             select(self._loadtab.c.matid,literal(analysis)) \
-                             .select_from(an_tab.join(self._loadtab,
-                                                      onclause=(an_tab.c[f"loadid - {mg}"]==self._loadtab.c.loadid))) \
-                             .distinct()) \
-                .on_conflict_do_nothing())
-        conn.execute(delete(an_tab))
-
-    def update_layout_parameters(self, layout_params, measurement_group, conn, dump_extractions=True):
+    # Each dump_* is a single statement: the DELETEs run in CTEs and their RETURNING feeds the INSERT into the
+    # ReExtract/ReAnalyze table, so it's one round-trip (and one plan) no matter how many groups are dumped together
+    def _dump_statement(self, target: Table, loadid_cols: dict[str,Column], target_columns: list[str],
+                        make_select_columns: Callable):
+        """ Makes a statement which deletes all rows from the tables of loadid_cols (a dict of group -> loadid column)
+        and inserts make_select_columns(dumped, loadtab) for each distinct deleted load into target.
+
+        The subquery dumped has the columns loadid and grp (the group the row was deleted for).
+        """
+        loadtab=self._loadtab
+        sels=[]
+        for i,(grp,col) in enumerate(loadid_cols.items()):
+            deleted=delete(col.table).returning(col.label('loadid')).cte(f'dumped{i}')
+            sels.append(select(deleted.c.loadid,literal(grp).label('grp')))
+        dumped=(union_all(*sels) if len(sels)>1 else sels[0]).subquery('dumped')
+        return pgsql_insert(target)\
+            .from_select(target_columns,
+                         select(*make_select_columns(dumped,loadtab))\
+                         .select_from(dumped.join(loadtab,onclause=(dumped.c.loadid==loadtab.c.loadid)))\
+                         .distinct())\
+            .on_conflict_do_nothing()
+
+    def dump_extractions(self, measurement_group: Union[str,list[str]], conn):
+        """Moves the extractions for measurement_group (or a list of groups) into the ReExtract table."""
+        mgs=[measurement_group] if isinstance(measurement_group,str) else list(measurement_group)
+        for mg in mgs:
+            if mg not in CONFIG.measurement_groups: raise ValueError(f"Unknown group '{mg}'")
+        tabs={mg:extr_tab for mg in mgs
+              if (extr_tab:=self._mgt(mg,'extr')) is not None and self._mgt(mg,'meas') is not None}
+        if not len(tabs): return
+        rextab,loadtab=self._rextab,self._loadtab
+        conn.execute(self._cached_statement(('dump_extractions',*tabs.items(),rextab,loadtab),
+            lambda: self._dump_statement(rextab,{mg:tab.c.loadid for mg,tab in tabs.items()},
+                                         ["matid","MeasGroup",'full_reload',*ALL_LOAD_COLUMNS],
+                                         lambda dumped,loadtab: [loadtab.c.matid,dumped.c.grp,literal(False),
+                                                                 *[loadtab.c[c] for c in ALL_LOAD_COLUMNS]])))
+
+    def dump_measurements(self, measurement_group: Union[str,list[str]], conn):
+        """Moves the measurements for measurement_group (or a list of groups) into the ReExtract table."""
+        mgs=[measurement_group] if isinstance(measurement_group,str) else list(measurement_group)
+        for mg in mgs:
+            if mg not in CONFIG.measurement_groups: raise ValueError(f"Unknown group '{mg}'")
+        tabs={mg:meas_tab for mg in mgs if (meas_tab:=self._mgt(mg,'meas')) is not None}
+        if not len(tabs): return
+        #raise Exception("Should this say on_conflict_do_update in case the conflict is with a previous re-extraction request?")
+        rextab,loadtab=self._rextab,self._loadtab
+        conn.execute(self._cached_statement(('dump_measurements',*tabs.items(),rextab,loadtab),
+            lambda: self._dump_statement(rextab,{mg:tab.c.loadid for mg,tab in tabs.items()},
+                                         ["matid","MeasGroup",'full_reload',*ALL_LOAD_COLUMNS],
+                                         lambda dumped,loadtab: [loadtab.c.matid,dumped.c.grp,literal(True),
+                                                                 *[loadtab.c[c] for c in ALL_LOAD_COLUMNS]])))
+
+    def dump_higher_analysis(self, analysis: Union[str,list[str]], conn):
+        """Moves the results for analysis (or a list of analyses) into the ReAnalyze table."""
+        ans=[analysis] if isinstance(analysis,str) else list(analysis)
+        for an in ans:
+            if an not in CONFIG.higher_analyses: raise ValueError(f"Unknown analysis '{an}'")
+        tabs={an:an_tab for an in ans if (an_tab:=self._hat(an)) is not None}
+        if not len(tabs): return
+        reatab,loadtab=self._reatab,self._loadtab
+        loadid_cols={an:tab.c[f"loadid - {list(CONFIG.higher_analyses[an]['required_dependencies'])[0]}"]
+                     for an,tab in tabs.items()}
+        conn.execute(self._cached_statement(('dump_higher_analysis',*tabs.items(),reatab,loadtab),
+            lambda: self._dump_statement(reatab,loadid_cols,["matid","analysis"],
+                                         lambda dumped,loadtab: [loadtab.c.matid,dumped.c.grp])))
+
+    def update_layout_parameters(self, layout_params, measurement_group, conn, dump_extractions=True, initial_load=False):
+        """ Makes the Layout table for measurement_group match layout_params.
+
+        If initial_load, the table must have been created in the current transaction, and the parameters will be
+        copied straight into it (see _upload_binary) rather than compared against its contents.
+        """
         self.establish_layout_parameters(layout_params,measurement_group,conn, on_mismatch='replace')
         tab=self._metadata.tables[f'{self.int_schema}.Layout -- {measurement_group}']
         mg=measurement_group
 
-        conn.execute(text(f'CREATE TEMP TABLE tmplay (LIKE {self.int_schema}."Layout -- {measurement_group}");'))
-        self._upload_csv(layout_params._tables_by_meas[measurement_group].reset_index(),
-                         conn, None, 'tmplay')
-        # https://dba.stackexchange.com/a/72642
-        if conn.execute(text(
-            f'''SELECT CASE WHEN EXISTS (TABLE {self.int_schema}."Layout -- {measurement_group}" EXCEPT TABLE tmplay)
-              OR EXISTS (TABLE tmplay EXCEPT TABLE {self.int_schema}."Layout -- {measurement_group}")
-            THEN 'different' ELSE 'same' END AS result ;''')).all()[0][0] == 'same':
+        # Cheap check first: if both the layout params and the table contents hash the same as after the last
+        # update, skip uploading to a temp table and comparing (the hash of the table contents is computed
+        # server-side, so any change to the table since then will still fall through to the full comparison)
+        df=layout_params._tables_by_meas[measurement_group]
+        # (with the SQL types of the columns rather than the dtypes, whose names vary between pandas versions)
+        df_hash=hashlib.md5(pd.util.hash_pandas_object(df,index=True).values.tobytes()
+                            +str([(k,self.pd_to_sql_types[str(dtype)].__name__) for k,dtype in df.dtypes.items()])
+                                .encode()).hexdigest()
+        table_hash_query=text(f'SELECT md5(string_agg(t::text, \',\' ORDER BY t."Structure"))'
+                              f' FROM {self.int_schema}."{tab.name}" t;')
+        if initial_load:
+            self._upload_binary(df.reset_index(), conn, self.int_schema, tab.name, initial_load=True)
+            changed,compared=True,False
+        else:
+            try: prev_hashes=self.get_obj(f'layout_hash.{mg}',conn=conn)
+            except KeyError: prev_hashes=None
+            if prev_hashes==(df_hash,conn.execute(table_hash_query).scalar_one()):
+                changed,compared=False,False
+            else:
+                conn.execute(text(f'CREATE TEMP TABLE tmplay (LIKE {self.int_schema}."Layout -- {measurement_group}");'))
+                self._upload_binary(df.reset_index(), conn, None, 'tmplay')
+                # https://dba.stackexchange.com/a/72642
+                changed=(conn.execute(text(
+                    f'''SELECT CASE WHEN EXISTS (TABLE {self.int_schema}."Layout -- {measurement_group}" EXCEPT TABLE tmplay)
+                      OR EXISTS (TABLE tmplay EXCEPT TABLE {self.int_schema}."Layout -- {measurement_group}")
+                    THEN 'different' ELSE 'same' END AS result ;''')).scalar_one() != 'same')
+                compared=True
+
+        if not changed:
             logger.debug(f"Layout parameters unchanged for {measurement_group}")
         else:
             logger.debug(f"Layout parameters changed for {measurement_group}, updating")
@@ -566,8 +852,9 @@ class PostgreSQLDatabase(AlchemyDatabase):
                     self.dump_higher_analysis(measurement_group,conn)
                 conn.execute(text(f'ALTER TABLE {self.int_schema}."Analysis -- {measurement_group}"' \
                                   f' DROP CONSTRAINT IF EXISTS "fk_struct -- {mg}";'))
-            conn.execute(delete(tab))
-            conn.execute(text(f'INSERT INTO {tab.schema}."{tab.name}" SELECT * from tmplay;'))
+            if not initial_load:
+                conn.execute(delete(tab))
+                conn.execute(text(f'INSERT INTO {tab.schema}."{tab.name}" SELECT * from tmplay;'))
             if (self._mgt(measurement_group,'meas') is not None):
                 conn.execute(text(f'ALTER TABLE {self.int_schema}."Meas -- {measurement_group}"' \
                                   f' ADD CONSTRAINT "fk_struct -- {mg}" FOREIGN KEY ("Structure")' \
@@ -576,12 +863,18 @@ class PostgreSQLDatabase(AlchemyDatabase):
                 conn.execute(text(f'ALTER TABLE {self.int_schema}."Analysis -- {measurement_group}"' \
                                   f' ADD CONSTRAINT "fk_struct -- {mg}" FOREIGN KEY ("Structure")' \
                                   f' REFERENCES {self.int_schema}."{tab.name}" ("Structure") ON DELETE CASCADE;'))
-
-        conn.execute(text(f'DROP TABLE tmplay;'))
+        if compared: conn.execute(text(f'DROP TABLE tmplay;'))
+        if changed or compared:
+            self.store_obj(f'layout_hash.{mg}',(df_hash,conn.execute(table_hash_query).scalar_one()),conn=conn)
         conn.commit()
 
 
-    def establish_measurement_group_tables(self,measurement_group,conn, on_mismatch='raise',just_metadata=False):
+    def establish_measurement_group_tables(self,measurement_group,conn, on_mismatch='raise',just_metadata=False,
+                                           view_sqls:Optional[list]=None):
+        """Ensures the Meas/Extr/Sweep tables for measurement_group.
+
+        If view_sqls is given, the SQL to (re)create the jmp view is appended to it rather than executed.
+        """
         mg, mg_info = measurement_group, CONFIG['measurement_groups'][measurement_group]
 
         do_recreate_view=False
@@ -662,17 +955,25 @@ class PostgreSQLDatabase(AlchemyDatabase):
                 f'Meas -- {mg}"."measid',
             ]
             view_cols=",".join([f'"{c}"' for c in view_cols])
-            conn.commit()
-            conn.execute(text(f'DROP VIEW IF EXISTS jmp."{mg}"; CREATE VIEW jmp."{mg}" AS SELECT {view_cols} from '\
+            view_sql=(f'DROP VIEW IF EXISTS jmp."{mg}"; CREATE VIEW jmp."{mg}" AS SELECT {view_cols} from '\
                 f'"Extr -- {mg}" '\
                 f'JOIN "Meas -- {mg}" ON "Extr -- {mg}".loadid="Meas -- {mg}".loadid '\
                                    f'AND "Extr -- {mg}".measid="Meas -- {mg}".measid ' +\
                 (f'JOIN "Layout -- {mg}" ON "Meas -- {mg}"."Structure"="Layout -- {mg}"."Structure" ' if conlay else '')+\
                 f'JOIN "Loads" ON "Loads".loadid="Meas -- {mg}".loadid ' +\
                 (f'JOIN "Dies" ON "Meas -- {mg}".dieid="Dies".dieid ' if condie else '')+\
-                f'JOIN "Materials" ON "Loads".matid="Materials".matid;'))
+                f'JOIN "Materials" ON "Loads".matid="Materials".matid;')
+            if view_sqls is not None: view_sqls.append(view_sql)
+            else:
+                conn.commit()
+                conn.execute(text(view_sql))
+
+    def establish_higher_analysis_tables(self,analysis, conn, on_mismatch='raise',just_metadata=False,
+                                         view_sqls:Optional[list]=None):
+        """Ensures the Analysis table for analysis.
 
-    def establish_higher_analysis_tables(self,analysis, conn, on_mismatch='raise',just_metadata=False):
+        If view_sqls is given, the SQL to (re)create the jmp view is appended to it rather than executed.
+        """
         reqlids=[Column(f'loadid - {mg}',INTEGER,ForeignKey(self._loadtab.c.loadid,**_CASC),nullable=False,index=True)
                  for mg in CONFIG.higher_analyses[analysis]['required_dependencies']]
         attlids=[Column(f'loadid - {mg}',INTEGER,ForeignKey(self._loadtab.c.loadid,**_CASC),nullable=True,index=True)
@@ -714,22 +1015,27 @@ class PostgreSQLDatabase(AlchemyDatabase):
             ]
             view_cols=",".join([f'"{c}"' for c in view_cols])
             an=analysis; mg=list(CONFIG.higher_analyses[analysis]['required_dependencies'])[0]
-            conn.execute(text(f'DROP VIEW IF EXISTS jmp."{an}"; CREATE VIEW jmp."{an}" AS SELECT {view_cols} from ' \
+            view_sql=(f'DROP VIEW IF EXISTS jmp."{an}"; CREATE VIEW jmp."{an}" AS SELECT {view_cols} from ' \
                               f'"Analysis -- {an}" ' \
                               f'JOIN "Loads" ON "Loads".loadid="Analysis -- {an}"."loadid - {mg}"' + \
                               (f'JOIN "Layout -- {an}" ON "Analysis -- {an}"."Structure"="Layout -- {an}"."Structure" ' if conlay else '')+\
                               (f'JOIN "Dies" ON "Analysis -- {an}".dieid="Dies".dieid ' if condie else '') +\
-                              f'JOIN "Materials" ON "Loads".matid="Materials".matid;'))
+                              f'JOIN "Materials" ON "Loads".matid="Materials".matid;')
+            if view_sqls is not None: view_sqls.append(view_sql)
+            else: conn.execute(text(view_sql))
 
     def _ensure_table_exists(self, conn, schema, table_name, *args,
                              on_mismatch:Union[str,Callable]='raise',
                              on_init: Callable= (lambda : None), just_metadata=False):
         with (returner_context(conn) if (just_metadata or conn) else self.engine_connect()) as conn:
             should_be_columns=[x for x in args if isinstance(x,Column)]
+            should_be_sig=tuple((c.name,c.type.__class__) for c in should_be_columns)
             if (tab:=self._metadata.tables.get(f'{schema}.{table_name}',None)) is not None:
+                # Skip the comparison if this very Table was already found to match this signature
+                if self._table_sigs.get((schema,table_name),None)==(tab,should_be_sig): return tab
                 try:
-                    assert [c.name for c in tab.columns]==[c.name for c in should_be_columns]
-                    assert [c.type.__class__ for c in tab.columns]==[c.type.__class__ for c in should_be_columns]
+                    assert tuple((c.name,c.type.__class__) for c in tab.columns)==should_be_sig
+                    self._table_sigs[(schema,table_name)]=(tab,should_be_sig)
                 except AssertionError:
                     logger.warning(f"Column mismatch in {tab.name} (note, only name and type class are checked)")
                     logger.warning(f"Currently in DB: {[(c.name,c.type.__class__.__name__) for c in tab.columns]}")
@@ -750,6 +1056,7 @@ class PostgreSQLDatabase(AlchemyDatabase):
                     logger.warning(f"Need to create {table_name}")
                 else:
                     tab=Table(table_name,self._metadata,*args)
+                    self._table_cache.clear()
                     if not just_metadata:
                         tab.create(conn)
                         on_init()
@@ -763,24 +1070,32 @@ class PostgreSQLDatabase(AlchemyDatabase):
             #                 .where(self._mattab.c[fullmatname_col]==material_info[fullmatname_col])\
             #                 .returning(self._mattab.c.date_user_changed)
             #print(conn.execute(text("EXPLAIN (ANALYZE,BUFFERS) "+str(statement.compile(compile_kwargs={'literal_binds':True})))).all())
-            res=conn.execute(delete(self._mattab)\
-                             .where(self._mattab.c[fullmatname_col]==material_info[fullmatname_col])\
-                             .returning(self._mattab.c.date_user_changed)).all()
+            mattab=self._mattab
+            res=conn.execute(self._cached_statement(('dump_material',mattab),
+                                lambda: delete(mattab)\
+                                    .where(mattab.c[fullmatname_col]==bindparam('matname'))\
+                                    .returning(mattab.c.date_user_changed)),
+                             {'matname':material_info[fullmatname_col]}).all()
             if len(res): return res[0][0]
         else:
-            conn.execute(delete(self._loadtab) \
-                             .where(self._mattab.c[fullmatname_col]==material_info[fullmatname_col]) \
-                             .where(self._mattab.c.matid==self._loadtab.c.matid)\
-                             .where(self._loadtab.c.MeasGroup==only_meas_group))
+            mattab,loadtab=self._mattab,self._loadtab
+            conn.execute(self._cached_statement(('dump_material_meas_group',mattab,loadtab),
+                                lambda: delete(loadtab) \
+                                    .where(mattab.c[fullmatname_col]==bindparam('matname')) \
+                                    .where(mattab.c.matid==loadtab.c.matid)\
+                                    .where(loadtab.c.MeasGroup==bindparam('meas_group'))),
+                         {'matname':material_info[fullmatname_col],'meas_group':only_meas_group})
 
     def enter_material(self, conn, user_called=True, **material_info):
         """Does not commit, so transaction will continue to have lock on Materials table."""
         fullmatname_col=CONFIG['database']['materials']['full_name']
         if not user_called:
-            res=conn.execute(select(self._mattab)\
-                             .where(self._mattab.c[fullmatname_col]==material_info[fullmatname_col])).all()
-            if len(res):
-                matid=dict(zip([c.name for c in self._mattab.columns],res[0]))['matid']
+            mattab=self._mattab
+            res=conn.execute(self._cached_statement(('mat_by_fullname',mattab),
+                                lambda: select(mattab.c.matid).where(mattab.c[fullmatname_col]==bindparam('name'))),
+                             {'name':material_info[fullmatname_col]}).first()
+            if res is not None:
+                matid=res[0]
                 # TODO: Could put a check here that the rest of material_info is accurate...
             else:
                 raise Exception(f"While regenerating, ran across unrecognized material {material_info[fullmatname_col]}")
@@ -791,12 +1106,116 @@ class PostgreSQLDatabase(AlchemyDatabase):
                                .values(**update_info)\
                                .on_conflict_do_update(index_elements=[fullmatname_col],set_=update_info)\
                                .returning(self._mattab.c.matid))\
-                        .all()[0][0]
+                        .scalar_one()
         return matid
 
+    def _push_meas_group(self, conn, meas_group, mt_or_df, matid, material_info, load_info,
+                         clear_all_from_material=True, re_extraction=False, diem=None):
+        """ Puts one meas group's entry into the Loads table and uploads its Meas, Sweep and Extr data (for push_data).
+
+        Returns (loadid, diem), where loadid is None if mt_or_df is not a MeasurementTable,
+        and diem is the DieXY->dieid map for the material's mask (fetched if needed and not given).
+        """
+        from datavac.io.measurement_table import MeasurementTable
+        #print(type(mt_or_df),isinstance(mt_or_df, MeasurementTable))
+        is_mt=isinstance(mt_or_df, MeasurementTable)
+        loadid=None
+
+        if not re_extraction:
+            # Put an entry into the Loads table and get the loadid
+            loadtab,rextab=self._loadtab,self._rextab
+            values=dict(matid=matid,MeasGroup=meas_group,**load_info)
+            if not clear_all_from_material:
+                # Drop any previous load from the Loads table in the same statement
+                # (if clear_material, this is already handled by dump_material in push_data).
+                # The insert's WHERE references the DELETE so that it runs first; otherwise Postgres would
+                # run the unreferenced DELETE last and the insert would collide on (matid, MeasGroup)
+                dumped=delete(loadtab)\
+                    .where(loadtab.c.matid==matid)\
+                    .where(loadtab.c.MeasGroup==meas_group)\
+                    .returning(loadtab.c.loadid).cte('dumped')
+                insrt=pgsql_insert(loadtab)\
+                    .from_select(list(values),
+                                 select(*[literal(v,loadtab.c[k].type) for k,v in values.items()])\
+                                    .where(select(func.count()).select_from(dumped).scalar_subquery()>=0))\
+                    .returning(loadtab.c.loadid)
+            else:
+                insrt=pgsql_insert(loadtab).values(**values).returning(loadtab.c.loadid)
+            if is_mt:
+                # In the same statement, drop this matid, MeasGroup from the refreshes table, saving a
+                # round-trip later (if anything below fails, the whole transaction is rolled back anyway)
+                insrt=insrt.add_cte(delete(rextab)\
+                                    .where(rextab.c.MeasGroup==meas_group)\
+                                    .where(rextab.c.matid==matid).cte('cleared'))
+            loadid=conn.execute(insrt).scalar_one()
+
+        if is_mt:
+            analysis_cols=list(CONFIG['measurement_groups'][meas_group]['analysis_columns'])
+            meas_cols=list(CONFIG['measurement_groups'][meas_group]['meas_columns'])
+
+            df=mt_or_df._dataframe
+
+            if not re_extraction:
+                # Upload the measurement list
+                with time_it(f"Meas table {meas_group} altogether"):
+                    mask=material_info['Mask']
+                    condie=CONFIG['measurement_groups'][meas_group].get('connect_to_die_table',True)
+                    conlay=CONFIG['measurement_groups'][meas_group].get('connect_to_layout_table',True)
+                    if condie:
+                        # Fetched at most once per push, and shared with perform_analyses
+                        if diem is None: diem=self._get_die_ids(mask,conn)
+                        dieids,diem=self._map_die_ids(df['DieXY'],diem,conn,mask=mask)
+                    # Built in one go from the column arrays, rather than by assign/rename/select copies
+                    df2=pd.DataFrame({'loadid':np.full(len(df),loadid,dtype=np.int64),
+                                      'measid':df.index.to_numpy(),
+                                      **({'Structure':df['Structure'].array} if conlay else {}),
+                                      **({'dieid':dieids.array} if condie else {}),
+                                      'rawgroup':df['rawgroup'].array,
+                                      **{c:df[c].array for c in meas_cols}})
+                    meastab=self._mgt(meas_group,'meas')
+                    self._upload_binary(df2,conn,self.int_schema,meastab.name,cast_to=meastab)
+
+                # Upload the raw sweep
+                meas_type=CONFIG.get_meas_type(meas_group)
+                sweepconv=(pd_to_pg_converters['STRING']) \
+                    if (hasattr(meas_type,'ONESTRING') and meas_type.ONESTRING) else lambda s: s.tobytes()
+                with time_it(f"Conversion to binary for {meas_group} sweeps",.1):
+                    bio=sweeps_to_pgbin(loadid,df[mt_or_df.headers],sweepconv)
+                self._upload_pgbin(bio,conn,self.int_schema,self._mgt(meas_group,'sweep').name)
+
+            # Upload the extracted values
+            needed_cols=(['loadid','measid'] if re_extraction else [])+analysis_cols
+            present_cols=set(df.columns)
+            if len(missing:=[c for c in needed_cols if c not in present_cols]):
+                logger.warning(f"Missing columns: {missing}")
+                logger.warning(f"Present columns are {list(df.columns)}")
+                raise KeyError(missing)
+            if not re_extraction:
+                df=pd.DataFrame({'loadid':np.full(len(df),loadid,dtype=np.int64),
+                                 'measid':df.index.to_numpy(),
+                                 **{c:df[c].array for c in analysis_cols}})
+            else:
+                df=df.loc[:,needed_cols]
+            # All one loadid (an elementwise compare to the first, rather than hashing out the unique values)
+            lids=df['loadid'].to_numpy(dtype=np.int64)
+            assert len(lids) and (lids==lids[0]).all()
+            loadid=int(lids[0])
+            try:
+                extrtab=self._mgt(meas_group,'extr')
+                self._upload_binary(
+                    df,
+                    conn,self.int_schema,extrtab.name,cast_to=extrtab
+                )
+            except Exception as e:
+                print("OOPS")
+                raise e
+
+            return loadid, diem
+        return None, diem
+
     def push_data(self, matload_info, data_by_meas_group:dict,
                   clear_all_from_material=True, user_called=True, re_extraction=False,
-                  defer_analyses=False):
+                  defer_analyses=False, parallel_meas_groups=False):
         """
         Notes
         -----
@@ -804,6 +1223,10 @@ class PostgreSQLDatabase(AlchemyDatabase):
         (ie after a table has been dropped). If `re_extraction=True`, `push_data` will
         make no effort to clear out prior data, so abuse of this can result in uniqueness
         violation errors.
+
+        `parallel_meas_groups=True` uploads the meas groups concurrently, each on its own connection.
+        That gives up atomicity: the material entry is committed first, and each meas group commits separately,
+        so a failure in one meas group leaves the others (and the material) in place.
         """
         fullmatname_col=CONFIG['database']['materials']['full_name']
         assert not (user_called and re_extraction), "Re-extraction is not a user-update"
@@ -825,122 +1248,102 @@ class PostgreSQLDatabase(AlchemyDatabase):
                                       date_user_changed=date_user_changed)
 
             # Invalidate the relevant analyses
-            insrt=[]
-            analyses=CONFIG.get_dependent_analyses(list(data_by_meas_group.keys()))
+            analyses=CONFIG.get_dependent_analyses(frozenset(data_by_meas_group))
             if len(analyses):
-                for an in analyses:
-                    insrt.append(
-                        str(pgsql_insert(self._reatab) \
-                            .values(matid=matid,analysis=an) \
-                            .on_conflict_do_nothing()\
-                            .compile(compile_kwargs={'literal_binds':True})))
-                conn.execute(text("; ".join(insrt)))
+                reatab=self._reatab
+                conn.execute(self._cached_statement(('invalidate_analysis',reatab),
+                                lambda: pgsql_insert(reatab)\
+                                    .values(matid=bindparam('matid'),analysis=bindparam('analysis'))\
+                                    .on_conflict_do_nothing()),
+                             [{'matid':matid,'analysis':an} for an in analyses])
 
 
             # For each meas_group
             collected_loadids={}
-            for meas_group, mt_or_df in data_by_meas_group.items():
-
-                if not re_extraction:
-                    # Drop any previous loads from the Loads table
-                    # (if clear_material, this is already handled by dump_material above)
-                    if not clear_all_from_material:
-                        self.dump_material(material_info, conn, only_meas_group=meas_group)
-
-                    # Put an entry into the Loads table and get the loadid
-                    loadid=conn.execute(pgsql_insert(self._loadtab)\
-                                       .values(matid=matid,MeasGroup=meas_group,**load_info)\
-                                       .returning(self._loadtab.c.loadid))\
-                                .all()[0][0]
-
-                #print(type(mt_or_df),isinstance(mt_or_df, MeasurementTable))
-                from datavac.io.measurement_table import MeasurementTable
-                if isinstance(mt_or_df, MeasurementTable):
-                    analysis_cols=list(CONFIG['measurement_groups'][meas_group]['analysis_columns'])
-                    meas_cols=list(CONFIG['measurement_groups'][meas_group]['meas_columns'])
-
-                    df=mt_or_df._dataframe
-
-                    if not re_extraction:
-                        # Upload the measurement list
-                        with time_it(f"Meas table {meas_group} altogether"):
-                            mask=material_info['Mask']
-                            condie=CONFIG['measurement_groups'][meas_group].get('connect_to_die_table',True)
-                            conlay=CONFIG['measurement_groups'][meas_group].get('connect_to_layout_table',True)
-                            if condie:
-                                diem=pd.DataFrame.from_records(conn.execute(select(self._diemtab.c.DieXY,self._diemtab.c.dieid)\
-                                                .where(self._diemtab.c.Mask==mask)).all(),columns=['DieXY','dieid'])
-                                df2=df.reset_index() \
-                                    .assign(loadid=loadid,Mask=mask).rename(columns={'index':'measid'}) \
-                                    [['loadid','measid',*(['Structure'] if conlay else []),'DieXY','rawgroup',*meas_cols]].merge(diem,how='left',on='DieXY')\
-                                    [['loadid','measid',*(['Structure'] if conlay else []),'dieid','rawgroup',*meas_cols]]
-                            else:
-                                df2=df.reset_index() \
-                                    .assign(loadid=loadid,Mask=mask).rename(columns={'index':'measid'})\
-                                    [['loadid','measid',*(['Structure'] if conlay else []),'rawgroup',*meas_cols]]
-                            self._upload_csv(df2,conn,self.int_schema,self._mgt(meas_group,'meas').name)
-
-                        # Upload the raw sweep
-                        meas_type=CONFIG.get_meas_type(meas_group)
-                        sweepconv=(pd_to_pg_converters['STRING']) \
-                            if (hasattr(meas_type,'ONESTRING') and meas_type.ONESTRING) else lambda s: s.tobytes()
-                        self._upload_binary(
-                            df[mt_or_df.headers]
-                                .stack().reset_index()
-                                .assign(loadid=loadid).rename(columns={'level_0':'measid','level_1':'header',0:'sweep'}) \
-                                [['loadid','measid','sweep','header']],
-                            conn,self.int_schema,self._mgt(meas_group,'sweep').name,
-                            override_converters={'sweep':sweepconv,'header':pd_to_pg_converters['STRING']}
-                        )
-
-                    # Upload the extracted values
-                    if not re_extraction:
-                        df=df.assign(loadid=loadid).reset_index().rename(columns={'index':'measid'})
-                    assert len(ulid:=df['loadid'].unique())==1
-                    try:
-                        df=df[['loadid','measid',*analysis_cols]]
-                    except KeyError as e:
-                        logger.warning(f"Missing columns: {str(e)}")
-                        logger.warning(f"Present columns are {list(df.columns)}")
-                        raise e
-                    loadid=int(ulid[0])
-                    try:
-                        self._upload_csv(
-                            df,
-                            conn,self.int_schema,self._mgt(meas_group,'extr').name
-                        )
-                    except Exception as e:
-                        print("OOPS")
-                        raise e
-
-                    # If we've succeeded thus far, we can drop this matid, MeasGroup from the refreshes table
-                    dstat=delete(self._rextab)\
-                        .where(self._rextab.c.MeasGroup==meas_group)\
-                        .where(self._rextab.c.matid==self._loadtab.c.matid) \
-                        .where(self._loadtab.c.loadid==loadid)
-                    if re_extraction:
-                        dstat=dstat.where(self._rextab.c.full_reload==False)
-                    #print(dstat.compile())
-                    conn.execute(dstat)
-
-                    collected_loadids[meas_group]=loadid
+            diem=None
+            if parallel_meas_groups and len(data_by_meas_group)>1:
+                # Each meas group gets its own connection (and transaction), so commit what's been done so far
+                conn.commit()
+                if any(CONFIG['measurement_groups'][mg].get('connect_to_die_table',True) for mg in data_by_meas_group):
+                    diem=self._get_die_ids(material_info['Mask'],conn)
+                def push_one(meas_group,mt_or_df):
+                    with self.engine_connect() as conn2:
+                        conn2.execute(text(f"SET SEARCH_PATH={self.int_schema};"))
+                        loadid,_=self._push_meas_group(conn2,meas_group,mt_or_df,matid,material_info,load_info,
+                                        clear_all_from_material=clear_all_from_material,
+                                        re_extraction=re_extraction,diem=diem)
+                        conn2.commit()
+                    return loadid
+                executor=ThreadPoolExecutor(min(len(data_by_meas_group),8),thread_name_prefix='push')
+                with executor:
+                    futures={mg:executor.submit(push_one,mg,mt_or_df) for mg,mt_or_df in data_by_meas_group.items()}
+                for meas_group,future in futures.items():
+                    if (loadid:=future.result()) is not None: collected_loadids[meas_group]=loadid
+            else:
+                for meas_group, mt_or_df in data_by_meas_group.items():
+                    loadid,diem=self._push_meas_group(conn,meas_group,mt_or_df,matid,material_info,load_info,
+                                        clear_all_from_material=clear_all_from_material,
+                                        re_extraction=re_extraction,diem=diem)
+                    if loadid is not None: collected_loadids[meas_group]=loadid
+
+            # If we've succeeded thus far, we can drop these matid, MeasGroup from the refreshes table, all in one go
+            # (when not re-extracting, that was already done along with each Loads insert)
+            if re_extraction and len(collected_loadids):
+                rextab,loadtab=self._rextab,self._loadtab
+                dstat=delete(rextab)\
+                    .where(rextab.c.matid==loadtab.c.matid)\
+                    .where(tuple_(rextab.c.MeasGroup,loadtab.c.loadid).in_(list(collected_loadids.items())))\
+                    .where(rextab.c.full_reload==False)
+                #print(dstat.compile())
+                conn.execute(dstat)
 
             if not defer_analyses:
                 self.perform_analyses(conn, analyses,
                                   precollected_data_by_meas_group=data_by_meas_group,
                                   precollected_loadids=collected_loadids,
-                                  precollected_matid=matid)
+                                  precollected_matid=matid,
+                                  precollected_diem=diem)
             conn.commit()
             logger.debug(f"Completed all tasks for {str(matload_info)}")
 
+    def _get_die_ids(self, mask, conn, refresh=False) -> dict[str,int]:
+        """Returns a dict mapping the DieXY of each die on mask to its dieid
+
+        The Dies table is small, so the whole thing is read on a miss (or if refresh) and cached in-process
+        (a die's dieid never changes once assigned, and update_mask_info clears the cache).
+        """
+        if refresh or (mask not in self._diem_cache):
+            diemtab=self._diemtab
+            # Filled before being swapped in, so parallel pushes never see a partly-read cache
+            diem_cache={}
+            for m,diexy,dieid in conn.execute(self._cached_statement(('get_die_ids',diemtab),
+                                    lambda: select(diemtab.c.Mask,diemtab.c.DieXY,diemtab.c.dieid))):
+                diem_cache.setdefault(m,{})[diexy]=dieid
+            self._diem_cache=diem_cache
+        return self._diem_cache.get(mask,{})
+
+    def _map_die_ids(self, diexys: pd.Series, diem: dict[str,int], conn, mask=None, matid=None) \
+            -> tuple[pd.Series,dict[str,int]]:
+        """Maps diexys to dieids through diem (from _get_die_ids), returning the dieids and the diem used
+
+        If any DieXY isn't in diem (eg another process has since added dies to the mask), the Dies table is re-read
+        once before accepting NA.  The mask is looked up from matid if not given.
+        """
+        dieids=diexys.map(diem).astype('Int64')
+        if (dieids.isna()&diexys.notna()).any():
+            if mask is None: mask=conn.execute(select(self._mattab.c.Mask).where(self._mattab.c.matid==matid)).scalar_one()
+            diem=self._get_die_ids(mask,conn,refresh=True)
+            dieids=diexys.map(diem).astype('Int64')
+        return dieids,diem
+
     def perform_analyses(self, conn, analyses,
-                         precollected_data_by_meas_group={}, precollected_loadids={}, precollected_matid=None):
+                         precollected_data_by_meas_group={}, precollected_loadids={}, precollected_matid=None,
+                         precollected_diem=None):
         mg_to_data=precollected_data_by_meas_group
         matid=precollected_matid
-        mask=conn.execute(select(self._mattab.c.Mask).where(self._mattab.c.matid==matid)).all()[0][0]
-        diem=pd.DataFrame.from_records(conn.execute(
-            select(self._diemtab.c.DieXY,self._diemtab.c.dieid) \
-                .where(self._diemtab.c.Mask==mask)).all(),columns=['DieXY','dieid'])
+        if (diem:=precollected_diem) is None:
+            mask=conn.execute(select(self._mattab.c.Mask).where(self._mattab.c.matid==matid)).scalar_one()
+            diem=self._get_die_ids(mask,conn)
         for an in analyses:
             condie=CONFIG['higher_analyses'][an].get('connect_to_die_table',True)
             conlay=CONFIG['higher_analyses'][an].get('connect_to_layout_table',False)
@@ -977,14 +1380,15 @@ class PostgreSQLDatabase(AlchemyDatabase):
             #            .assign(loadid=loadid,Mask=mask).rename(columns={'index':'measid'}) \
             #            [['loadid','measid','Structure','DieXY','rawgroup',*meas_cols]].merge(diem,how='left',on='DieXY') \
             #            [['loadid','measid','Structure','dieid','rawgroup',*meas_cols]]
-            #        self._upload_csv(df2,conn,self.int_schema,self._mgt(meas_group,'meas').name)
+            #        self._upload_binary(df2,conn,self.int_schema,self._mgt(meas_group,'meas').name)
 
             if condie:
-                df=df.merge(diem,how='left',on='DieXY')
+                dieids,diem=self._map_die_ids(df['DieXY'],diem,conn,matid=matid)
+                df=df.assign(dieid=dieids)
             df=df.assign(**loadids)
-            self._upload_csv(
+            self._upload_binary(
                 df[[*(loadids.keys()),*(['Structure'] if conlay else []),*(['dieid'] if condie else []),*CONFIG.higher_analyses[an]['analysis_columns']]],
-                conn,self.int_schema,self._hat(an).name
+                conn,self.int_schema,self._hat(an).name,cast_to=self._hat(an)
             )
 
             conn.execute(delete(self._reatab)\
@@ -1054,6 +1458,7 @@ class PostgreSQLDatabase(AlchemyDatabase):
         condie=CONFIG['higher_analyses'][analysis].get('connect_to_die_table',True)
         anlytab=self._hat(analysis)
         if conlay: layotab=self._mgt(analysis,'layout')
+        else: layotab=None
         involved_tables=([anlytab]+ \
                          [*([self._diemtab] if condie else []),self._loadtab,self._mattab]+ \
                          ([layotab] if conlay else []))
@@ -1068,34 +1473,24 @@ class PostgreSQLDatabase(AlchemyDatabase):
             selcols=list(set([get_col(sc.name) for sc in all_cols]))
 
         mg=list(CONFIG.higher_analyses[analysis]['required_dependencies'])[0]
-        thejoin=functools.reduce((lambda x,y: x.join(y)
-                                    if y is not self._loadtab
-                                    else x.join(y,onclause=(anlytab.c[f"loadid - {mg}"]==self._loadtab.c.loadid))),
-                                 involved_tables)
+        thejoin=self._explicit_join(involved_tables,
+                                    self._onclauses(anlytab,layotab,loadid_col=anlytab.c[f"loadid - {mg}"]))
         sel=select(*selcols).select_from(thejoin)
         sel=functools.reduce((lambda s, f: s.where(get_col(f).in_(factors[f]))), factors, sel)
         with (returner_context(conn) if conn else self.engine_connect()) as conn:
-            data=pd.read_sql(sel,conn,dtype={c.name:self.sql_to_pd_types[c.type.__class__] for c in selcols
-                                             if c.type.__class__ in self.sql_to_pd_types})
+            data=self._read_sql(sel,conn,selcols)
         return data
 
     def get_data_from_meas_group(self,meas_group,scalar_columns=None,include_sweeps=False,
                  unstack_headers=False,raw_only=False,conn=None,**factors):
-        meastab=self._mgt(meas_group,'meas')
         sweptab=self._mgt(meas_group,'sweep')
-        extrtab=self._mgt(meas_group,'extr')
-        layotab=self._mgt(meas_group,'layout')
-        diemtab=self._diemtab if CONFIG['measurement_groups'][meas_group].get('connect_to_die_table',True) else None
 
         if include_sweeps not in [True,False]:
             if len(include_sweeps):
                 factors['header']=include_sweeps
             else:
                 include_sweeps=False
-        involved_tables=(([extrtab] if not raw_only else [])+\
-                            [meastab,diemtab,layotab,self._loadtab,self._mattab]\
-                        +([sweptab] if include_sweeps else []))
-        involved_tables=[t for t in involved_tables if t is not None]
+        involved_tables,thejoin=self._full_join_for_meas(meas_group,include_sweeps=include_sweeps,raw_only=raw_only)
         all_cols=[c for tab in involved_tables for c in tab.columns]
         def get_col(cname):
             try:
@@ -1112,7 +1507,6 @@ class PostgreSQLDatabase(AlchemyDatabase):
         selcols+=([sweptab.c.sweep,sweptab.c.header] if include_sweeps else [])
 
         ## TODO: Be more selective in thejoin
-        thejoin=functools.reduce((lambda x,y: x.join(y)),involved_tables)
         sel=select(*selcols).select_from(thejoin)
         sel=functools.reduce((lambda s, f: s.where(get_col(f).in_(factors[f]))), factors, sel)
 
@@ -1123,16 +1517,24 @@ class PostgreSQLDatabase(AlchemyDatabase):
                                          unstack_headers=False,raw_only=False,conn=None) -> pd.DataFrame:
         with (returner_context(conn) if conn else self.engine_connect()) as conn:
             with time_it("Actual read_sql",threshold_time=.03):
-                data=pd.read_sql(sel,conn,dtype={c.name:self.sql_to_pd_types[c.type.__class__] for c in selcols
-                                                if c.type.__class__ in self.sql_to_pd_types})
+                data=self._read_sql(sel,conn,selcols)
         if 'sweep' in data:
             with time_it("Sweep decoding",threshold_time=.03):
                 meas_type=CONFIG.get_meas_type(meas_group)
                 if not (hasattr(meas_type,'ONESTRING') and meas_type.ONESTRING):
-                    for h in list(data['header'].unique()):
+                    for h in ([] if getattr(meas_type,'all_sweeps_float32',False) else list(data['header'].unique())):
                         assert meas_type.get_preferred_dtype(h) in [np.float32,'onestring'],\
                             "Haven't dealt with sweeps that aren't float32 or 'onestring'"
-                    data['sweep']=data['sweep'].map(functools.partial(np.frombuffer, dtype=np.float32))
+                    # Decode all sweeps from one joined buffer, then split it back into per-row (read-only) views
+                    sweeps=data['sweep'].to_numpy()
+                    bytelens=np.fromiter(map(len,sweeps),dtype=np.int64,count=len(sweeps))
+                    # Checked per row, since corrupt rows could otherwise sum to a whole number of floats
+                    # and shift every later sweep into the wrong row
+                    assert (bytelens%4==0).all(), f"Corrupt sweep(s) in {meas_group}: byte length not a multiple of 4"
+                    lens=bytelens//4
+                    big=np.frombuffer(b''.join(sweeps),dtype=np.float32)
+                    data['sweep']=pd.Series(np.split(big,np.cumsum(lens)[:-1]) if len(sweeps) else [],
+                                            index=data.index,dtype=object)
                 else:
                     data['sweep']=data['sweep'].map(lambda x: x.decode('utf-8'))
             if include_sweeps and unstack_headers:
@@ -1181,16 +1583,17 @@ class PostgreSQLDatabase(AlchemyDatabase):
 
     @staticmethod
     def _unstack_header_helper(data,unstacking_indices, drop_index=True):
-        sweep_part=data[[*unstacking_indices,'header','sweep']] \
-            .pivot(index=unstacking_indices,columns='header',values='sweep')
+        # unstack (like pivot) raises on duplicate entries, and drop_duplicates makes other_part's index unique,
+        # so an index join is enough (no need for merge's validate='1:1')
+        sweep_part=data.set_index([*unstacking_indices,'header'])['sweep'].unstack('header')
         other_part=data.drop(columns=['header','sweep']) \
             .drop_duplicates(subset=unstacking_indices).set_index(unstacking_indices)
-        return pd.merge(sweep_part,other_part,how='inner',
-                        left_index=True,right_index=True,validate='1:1').reset_index(drop=drop_index)
+        return sweep_part.join(other_part,how='inner').reset_index(drop=drop_index)
 
     @staticmethod
     def joined_table(factor_names:list[str],absolute_needs:list[Table],
-                     table_depends:dict[Table,list[Table]], pre_filters:dict[str,list]):
+                     table_depends:dict[Table,list[Table]], pre_filters:dict[str,list],
+                     onclauses:dict[Table,Any]={}):
         """ Creates an SQL Alchemy Select joining the tables needed to get the desired factors
 
         Args:
@@ -1198,6 +1601,7 @@ class PostgreSQLDatabase(AlchemyDatabase):
             absolute_needs: list of tables which must be included in the join
             table_depends: mapping of dependencies which tables have on other tables to be joined
             pre_filters: filters (column name to list of allowed values) to apply to the data before joining
+            onclauses: join condition for each table (tables not in it are joined by foreign key)
 
         Returns:
             An SQLAlchemy Select
@@ -1224,7 +1628,7 @@ class PostgreSQLDatabase(AlchemyDatabase):
                         ordered_needed_tables.append(n)
                         need_queue.remove(n)
                     else: need_queue|=set(further_needs)
-            return functools.reduce((lambda x,y: x.join(y)),ordered_needed_tables)
+            return functools.reduce((lambda x,y: x.join(y,onclause=onclauses.get(y,None))),ordered_needed_tables)
         return apply_wheres(select(*factor_cols).select_from(apply_joins()))
 
     def get_factors(self,meas_group_or_analysis,factor_names,pre_filters={}):
@@ -1250,10 +1654,16 @@ class PostgreSQLDatabase(AlchemyDatabase):
         if condie: table_depends[self._diemtab]=[self._mattab]
         if conlay: table_depends[layotab:=self._mgt(mgoa,'layout')]=[coretab]
         assert not any(t is None for t in table_depends)
+        if which == 'measurement_groups':
+            onclauses=self._onclauses(coretab,layotab if conlay else None)
+            onclauses[extrtab]=and_(extrtab.c.loadid==meastab.c.loadid,extrtab.c.measid==meastab.c.measid)
+        else:
+            mg=list(CONFIG.higher_analyses[mgoa]['required_dependencies'])[0]
+            onclauses=self._onclauses(coretab,layotab if conlay else None,loadid_col=coretab.c[f"loadid - {mg}"])
 
         # Define a select with the pre_filtered data and set it up as a CTE named tmp
         bigtable=self.joined_table(factor_names=factor_names,absolute_needs=[coretab],
-                                   table_depends=table_depends,pre_filters=pre_filters)\
+                                   table_depends=table_depends,pre_filters=pre_filters,onclauses=onclauses)\
             .compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
         query="WITH tmp AS ("+str(bigtable)+")\n"
 
@@ -1315,7 +1725,6 @@ class PostgreSQLDatabase(AlchemyDatabase):
         if not len(res): raise KeyError(name)
         assert len(res)==1
         with time_it(f"Unpickling {name} from DB",threshold_time=.1):
-            print(len(res[0][0]))
             return pickle.loads(res[0][0])
     def get_obj_date(self,name, conn=None):
         with time_it(f"Getting '{name}' date from DB",threshold_time=.001):
@@ -1399,8 +1808,7 @@ def cli_dump_measurement(*args):
 
     db=get_database(metadata_source='reflect')
     with db.engine_connect() as conn:
-        for mg in (namespace.group if namespace.group else CONFIG.measurement_groups):
-            db.dump_measurements(mg,conn)
+        db.dump_measurements(list(namespace.group if namespace.group else CONFIG.measurement_groups),conn)
         conn.commit()
 
 def cli_dump_extraction(*args):
@@ -1410,8 +1818,7 @@ def cli_dump_extraction(*args):
 
     db=get_database(metadata_source='reflect')
     with db.engine_connect() as conn:
-        for mg in (namespace.group if namespace.group else CONFIG.measurement_groups):
-            db.dump_extractions(mg,conn)
+        db.dump_extractions(list(namespace.group if namespace.group else CONFIG.measurement_groups),conn)
         conn.commit()
 
 def cli_dump_analysis(*args):
@@ -1421,9 +1828,9 @@ def cli_dump_analysis(*args):
 
     db=get_database(metadata_source='reflect')
     with db.engine_connect() as conn:
-        for an in (namespace.analysis if namespace.analysis else CONFIG.higher_analyses):
-            print(f"Dumping {an}")
-            db.dump_higher_analysis(an,conn)
+        ans=list(namespace.analysis if namespace.analysis else CONFIG.higher_analyses)
+        print(f"Dumping {ans}")
+        db.dump_higher_analysis(ans,conn)
         conn.commit()
 
 def cli_force_database(*args):
@@ -1512,6 +1919,7 @@ def read_and_upload_data(db,folders=None,only_material={},only_meas_groups=None,
             logger.info(f"Uploading {matname}")
             db.push_data(matname_to_inf[matname],matname_to_data[matname],
                          clear_all_from_material=clear_all_from_material, user_called=user_called)
+heal_batch_size=1000
 def heal(db: PostgreSQLDatabase,force_all_meas_groups=False):
     """ Goes in order of most recent material first, and within that, reloads first than re-extractions."""
     from datavac.io.meta_reader import perform_extraction, get_cached_glob
@@ -1520,102 +1928,142 @@ def heal(db: PostgreSQLDatabase,force_all_meas_groups=False):
     matcolnames=[*CONFIG['database']['materials']['info_columns']]
     loadcolnames=[*CONFIG['database']['loads']['info_columns']]
     with db.engine_connect() as conn:
-        res=conn.execute(select(db._rextab.c.matid,
-                                *[db._mattab.c[n] for n in [fullname]+matcolnames],
-                                *[db._rextab.c[n] for n in loadcolnames],
-                                )\
-                         .select_from(db._rextab.join(db._mattab))\
-                         .order_by(db._mattab.c.date_user_changed.desc())).all()
-        if not len(res):
+        # Info for every material with pending work (in order of most recently changed), fetched once and joined
+        # client-side below.  Re-extraction only adds ReAnalyze entries for materials already in ReExtract.
+        # Rows are streamed from a server-side cursor in batches (yield_per implies stream_results)
+        pending=union_all(select(db._rextab.c.matid),select(db._reatab.c.matid))
+        mat_lookup={matid:(matname,other_matinfo) for matid,matname,*other_matinfo in conn.execute(
+                select(db._mattab.c.matid,*[db._mattab.c[n] for n in [fullname]+matcolnames])\
+                    .where(db._mattab.c.matid.in_(pending))\
+                    .order_by(db._mattab.c.date_user_changed.desc(),db._mattab.c.matid)\
+                    .execution_options(yield_per=heal_batch_size))}
+
+        # One query gets every ReExtract entry, grouped by material: reloads are bucketed by their load info
+        # (which is per meas group), re-extracts just listed
+        rex_reloads,rex_reextracts={},{}
+        for matid,*loadinfo,full_reload,mg in conn.execute(
+                select(db._rextab.c.matid,
+                       *[db._rextab.c[n] for n in loadcolnames],
+                       db._rextab.c.full_reload, db._rextab.c.MeasGroup)\
+                    .execution_options(yield_per=heal_batch_size)):
+            if full_reload: rex_reloads.setdefault(matid,{}).setdefault(tuple(loadinfo),[]).append(mg)
+            else: rex_reextracts.setdefault(matid,[]).append(mg)
+        rex_mats={matid:info for matid,info in mat_lookup.items() if matid in rex_reloads or matid in rex_reextracts}
+        # Don't hold the read transaction open while materials are healed (uploads use their own connections)
+        conn.commit()
+
+        # The same sets of meas groups tend to recur across materials, so each sufficient set is only worked out once
+        sufficient_cache={}
+        def sufficient_meas_groups(meas_groups):
+            key=None if meas_groups is None else frozenset(meas_groups)
+            if key not in sufficient_cache:
+                sufficient_cache[key]=ensure_meas_group_sufficiency(meas_groups,on_error='ignore')
+            return list(sufficient_cache[key])
+        if not len(rex_mats):
             logger.info("Nothing needs re-loading or re-extracting!")
         else:
-            for matid,matname,*other_matinfo in res:
+            for matid,(matname,other_matinfo) in rex_mats.items():
                 # Reloads
                 logger.info(f"Looking at {matname}: {other_matinfo}")
-                res=conn.execute(select(db._rextab.c.MeasGroup) \
-                                 .where(db._rextab.c.matid==matid)\
-                                 .where(db._rextab.c.full_reload==True)).all()
-                if not len(res):
+                reloads=rex_reloads.get(matid,{})
+                if not len(reloads):
                     logger.info("Nothing to reload")
-                else:
-                    logger.info("Doing reloads")
-                    meas_groups=None if force_all_meas_groups else [r[0] for r in res]
-                    all_meas_groups=ensure_meas_group_sufficiency(meas_groups,on_error='ignore')
+                reloaded=set()
+                for loadinfo,reload_mgs in reloads.items():
+                    # Meas groups uploaded by an earlier reload of this material don't need doing again
+                    if not force_all_meas_groups and not len(reload_mgs:=[mg for mg in reload_mgs if mg not in reloaded]):
+                        continue
+                    logger.info(f"Doing reloads for {list(loadinfo)}")
+                    meas_groups=None if force_all_meas_groups else reload_mgs
+                    all_meas_groups=sufficient_meas_groups(meas_groups)
                     read_and_upload_data(db,
                          only_material=dict(**{fullname:matname},
-                                            **dict(zip(matcolnames+loadcolnames,[[om] for om in other_matinfo]))),
+                                            **dict(zip(matcolnames+loadcolnames,[[om] for om in [*other_matinfo,*loadinfo]]))),
                          only_meas_groups=all_meas_groups,
                          clear_all_from_material=False,user_called=False,cached_glob=cached_glob)
+                    reloaded.update(all_meas_groups)
 
                 # Re-extracts
-                res=conn.execute(select(db._rextab.c.MeasGroup) \
-                                 .where(db._rextab.c.matid==matid) \
-                                 .where(db._rextab.c.full_reload==False)).all()
-                if not len(res):
+                # A reload clears the ReExtract rows of every meas group it uploads (whatever their full_reload),
+                # so if there was one, what's left to re-extract is re-read rather than taken from the scan above
+                reextract_mgs=rex_reextracts.get(matid,[]) if not len(reloaded) else \
+                    conn.execute(select(db._rextab.c.MeasGroup)\
+                                    .where(db._rextab.c.matid==matid)\
+                                    .where(db._rextab.c.full_reload==False)).scalars().all()
+                if not len(reextract_mgs):
                     logger.info("Nothing to re-extract")
                 else:
                     logger.info("Doing re-extractions")
-                    meas_groups=[r[0] for r in res]
-                    all_meas_groups=ensure_meas_group_sufficiency(meas_groups,on_error='ignore')
+                    meas_groups=reextract_mgs
+                    all_meas_groups=sufficient_meas_groups(meas_groups)
                     logger.info(f"Pulling sweeps for {all_meas_groups} to re-extract {meas_groups}")
-                    mumts={mg:db.get_data_for_regen(mg,matname=matname,on_no_data=None,conn=conn) for mg in all_meas_groups}
-                    mumts={k:v for k,v in mumts.items() if v is not None}
+                    mumts={}
+                    for mg in all_meas_groups:
+                        if (mt:=db.get_data_for_regen(mg,matname=matname,on_no_data=None,conn=conn)) is not None:
+                            mumts[mg]=mt
                     logger.info(f"Re-extracting {meas_groups}")
                     perform_extraction({matname:mumts})
                     logger.info(f"Pushing new extraction for {meas_groups}")
-                    db.push_data({fullname:matname},{k:v for k,v in mumts.items() if k in meas_groups},
+                    db.push_data({fullname:matname},{mg:mumts[mg] for mg in meas_groups if mg in mumts},
                                  clear_all_from_material=False,
                                  user_called=False, re_extraction=True, defer_analyses=True)
 
-        res=conn.execute(select(db._reatab.c.matid,
-                                *[db._mattab.c[n] for n in [fullname]+matcolnames],) \
-                         .select_from(db._reatab.join(db._mattab)) \
-                         .order_by(db._mattab.c.date_user_changed.desc())).all()
-        if not len(res):
+                # End this material's transaction on conn (from the reads for re-extraction) before the next
+                conn.commit()
+
+        # Likewise for ReAnalyze (which must be read after the above, since re-extraction defers analyses to here)
+        rea_ans={}
+        for matid,an in conn.execute(select(db._reatab.c.matid,db._reatab.c.analysis)\
+                                        .execution_options(yield_per=heal_batch_size)):
+            rea_ans.setdefault(matid,[]).append(an)
+        rea_mats={matid:info for matid,info in mat_lookup.items() if matid in rea_ans}
+        if not len(rea_mats):
             logger.info("Nothing needs re-analyzing!")
         else:
             logger.info("Doing re-analyses")
-            for matid,matname,*other_matinfo in res:
+            for matid,(matname,other_matinfo) in rea_mats.items():
                 # Re-analyses
-                res=conn.execute(select(db._reatab.c.analysis) \
-                                 .where(db._reatab.c.matid==matid)).all()
-                if not len(res):
+                analyses=rea_ans.get(matid,[])
+                if not len(analyses):
                     logger.info("Nothing to re-analyze")
-                else:
-                    logger.info(f"Looking at {matname}")
-                    analyses=[r[0] for r in res]
-                    req_meas_groups=CONFIG.get_dependency_meas_groups_for_analyses(analyses,required_only=True)
-                    all_meas_groups=CONFIG.get_dependency_meas_groups_for_analyses(analyses,required_only=False)
-                    logger.info(f"Pulling measured and extracted data for {list(dict(**all_meas_groups).keys())}")
-                    mumts={}
-                    from datavac.io.measurement_table import MultiUniformMeasurementTable, UniformMeasurementTable
-                    precol_loadids={}
-                    for mg in all_meas_groups:
-                        mg_info = CONFIG['measurement_groups'][mg]
-                        condie = mg_info.get('connect_to_die_table', True)
-                        conlay = mg_info.get('connect_to_layout_table', True)
-                        data=db.get_data(meas_group=mg, include_sweeps=False,
-                                         scalar_columns=[*mg_info['meas_columns'],*mg_info['analysis_columns'],
-                                                         'loadid',*(['DieXY'] if condie else []),*(['Structure'] if conlay else []),
-                                                         CONFIG['database']['materials']['full_name'],
-                                                         *CONFIG['database']['materials']['info_columns']],
-                                         **{CONFIG['database']['materials']['full_name']:[matname]})
-                        if mg in req_meas_groups:
-                            #assert len(data), f"Missing required data for '{mg}' in {matname}"
-                            if not len(data):
-                                logger.warning(f"Missing required data for '{mg}' in {matname}")
-                                continue
-                        if len(data):
-                            mumts[mg]=UniformMeasurementTable(dataframe=data,headers=[],
-                                                              meas_length=None,meas_type=None,meas_group=mg)
-                            assert len(list(data['loadid'].unique()))==1
-                            precol_loadids[mg]=data['loadid'].iloc[0]
-                    logger.info(f"Re-analyzing {analyses} for {matname}")
-                    db.perform_analyses(conn,analyses=analyses,
-                                        precollected_data_by_meas_group=mumts,
-                                        precollected_loadids=precol_loadids,
-                                        precollected_matid=matid)
-                    conn.commit()
+                    continue
+                logger.info(f"Looking at {matname}")
+                # Only the names of the required meas groups matter here
+                req_meas_groups=frozenset(CONFIG.get_dependency_meas_groups_for_analyses(analyses,required_only=True))
+                all_meas_groups=CONFIG.get_dependency_meas_groups_for_analyses(analyses,required_only=False)
+                logger.info(f"Pulling measured and extracted data for {list(all_meas_groups)}")
+                mumts={}
+                precol_loadids={}
+                def read_meas_group(mg):
+                    mg_info = CONFIG['measurement_groups'][mg]
+                    condie = mg_info.get('connect_to_die_table', True)
+                    conlay = mg_info.get('connect_to_layout_table', True)
+                    return db.get_data(meas_group=mg, include_sweeps=False,
+                                     scalar_columns=[*mg_info['meas_columns'],*mg_info['analysis_columns'],
+                                                     'loadid',*(['DieXY'] if condie else []),*(['Structure'] if conlay else []),
+                                                     CONFIG['database']['materials']['full_name'],
+                                                     *CONFIG['database']['materials']['info_columns']],
+                                     **{CONFIG['database']['materials']['full_name']:[matname]})
+                # Each read is I/O-bound on its own pooled connection, so the meas groups are read concurrently
+                with ThreadPoolExecutor(min(len(all_meas_groups),8) or 1,thread_name_prefix='heal') as executor:
+                    all_data=dict(zip(all_meas_groups,executor.map(read_meas_group,all_meas_groups)))
+                for mg,data in all_data.items():
+                    if mg in req_meas_groups:
+                        #assert len(data), f"Missing required data for '{mg}' in {matname}"
+                        if not len(data):
+                            logger.warning(f"Missing required data for '{mg}' in {matname}")
+                            continue
+                    if len(data):
+                        mumts[mg]=UniformMeasurementTable.from_scalar_only(data,meas_group=mg)
+                        lids=data['loadid'].to_numpy(dtype=np.int64)
+                        assert (lids==lids[0]).all()
+                        precol_loadids[mg]=data['loadid'].iloc[0]
+                logger.info(f"Re-analyzing {analyses} for {matname}")
+                db.perform_analyses(conn,analyses=analyses,
+                                    precollected_data_by_meas_group=mumts,
+                                    precollected_loadids=precol_loadids,
+                                    precollected_matid=matid)
+                conn.commit()
 
         logger.info(f"Done healing.")
 
@@ -1697,27 +2145,67 @@ def cli_upload_all_data(*args):
 class DDFDatabase(Database):
     def __init__(self,ddf={}):
         self._ddf=ddf
+        self._meta_cache={}
+    def _meta(self,meas_group) -> SimpleNamespace:
+        """ Column info and arrays for meas_group's DataFrame, cached until that DataFrame is replaced in the ddf
+
+        Has attributes df, headers (the object-dtype sweep columns), scalars (the rest), arrays (column->array)
+        and positions (column->{value->row positions}, filled in lazily by _value_rows)
+        """
+        df=self._ddf[meas_group]
+        if (meta:=self._meta_cache.get(meas_group,None)) is None or meta.df is not df:
+            headers=[k for k,v in df.dtypes.items() if v==object]
+            meta=self._meta_cache[meas_group]=SimpleNamespace(df=df,headers=headers,
+                        scalars=[k for k in df.columns if k not in headers],
+                        arrays={c:df[c].array for c in df.columns},positions={})
+        return meta
+    @staticmethod
+    def _value_rows(meta:SimpleNamespace,fname) -> dict:
+        """ Map from each (non-null) value of column fname to the ascending positions of the rows which have it """
+        if (vp:=meta.positions.get(fname,None)) is None:
+            codes,uniques=pd.factorize(meta.arrays[fname])
+            order=np.argsort(codes,kind='stable')
+            bounds=np.searchsorted(codes[order],np.arange(len(uniques)+1))
+            vp=meta.positions[fname]={u:order[bounds[i]:bounds[i+1]] for i,u in enumerate(uniques)}
+        return vp
+    @staticmethod
+    def _factor_rows(meta:SimpleNamespace,factors:dict) -> Optional[np.ndarray]:
+        """ Positions of the rows whose value for each factor is among the allowed values for it
+        (or None if there are no factors, ie all rows)
+
+        Each factor after the first is only checked on the rows which survived the previous ones,
+        so a selective filter (eg on material) shrinks the work for the rest.
+        """
+        keep=None # positions of the rows kept so far (None for all)
+        for fname,fvals in factors.items():
+            if keep is not None and not len(keep): break
+            # The common single-value filter (eg one material) on all rows is just a lookup in that column's index
+            if keep is None and not isinstance(fvals,str) and len(fvals)==1 and isinstance(fval:=next(iter(fvals)),str):
+                keep=DDFDatabase._value_rows(meta,fname).get(fval,np.array([],dtype=np.intp))
+                continue
+            arr=meta.arrays[fname] if keep is None else meta.arrays[fname].take(keep)
+            # De-duplicated once, so isin doesn't hash repeats (a bare str is left for isin to reject as before)
+            hit=pd.Series(arr,copy=False).isin(fvals if isinstance(fvals,(str,frozenset)) else frozenset(fvals))\
+                .to_numpy()
+            keep=np.flatnonzero(hit) if keep is None else keep[hit]
+        return keep
     def get_data(self,meas_group,scalar_columns=None,include_sweeps=False,unstack_headers=False,raw_only=False,**factors):
         assert unstack_headers
         assert not raw_only
 
-        df=self._ddf[meas_group]
-        avail_header_cols=[k for k,v in df.dtypes.items() if str(v)=='object']
-        avail_scalar_cols=[k for k in df.columns if k not in avail_header_cols]
-
-        df=df[functools.reduce(np.logical_and,
-                     [df[fname].isin(fvals) for fname,fvals in factors.items()],
-                     pd.Series([True]*len(df)))]
+        meta=self._meta(meas_group)
+        keep=self._factor_rows(meta,factors)
 
-        cols=[*(avail_header_cols if include_sweeps is True else include_sweeps if include_sweeps else []),
-              *(scalar_columns if scalar_columns else avail_scalar_cols)]
-        return df[cols].reset_index()
+        cols=[*(meta.headers if include_sweeps is True else include_sweeps if include_sweeps else []),
+              *(scalar_columns if scalar_columns else meta.scalars)]
+        # Gathers just the selected rows of just the needed columns (rather than filtering all columns, then selecting),
+        # on a fresh RangeIndex like the other databases return
+        return pd.DataFrame({c:(meta.arrays[c] if keep is None else meta.arrays[c].take(keep)) for c in cols})
     def get_factors(self,meas_group,factor_names,pre_filters={}):
-        df=self._ddf[meas_group]
-        df=df[functools.reduce(np.logical_and,
-                     [df[fname].isin(fvals) for fname,fvals in pre_filters.items()],
-                     pd.Series([True]*len(df)))]
-        return {fn:list(df[fn].unique()) for fn in factor_names}
+        meta=self._meta(meas_group)
+        keep=self._factor_rows(meta,pre_filters)
+        return {fn:list(pd.Series(meta.arrays[fn] if keep is None else meta.arrays[fn].take(keep),copy=False).unique())
+                for fn in factor_names}
 
 
 def pickle_db_cached(namer: Union[Callable,str], namespace:Optional[str]=None, conn:Connection=None):
@@ -119,6 +119,21 @@ class UniformMeasurementTable(MeasurementTable):
 
         check_dtypes(self.scalar_table)
 
+    @classmethod
+    def from_scalar_only(cls,dataframe,meas_group):
+        """ Wraps a scalar-only (no headers, no meas_type) dataframe, eg freshly read from the database.
+
+        Unlike the constructor, this neither copies dataframe nor checks its dtypes, so the caller should hand
+        over a dataframe it won't otherwise use.
+        """
+        assert isinstance(dataframe.index,pd.RangeIndex) and dataframe.index.start==0 and dataframe.index.step==1, \
+            "Make sure the dataframe has a default index for UniformMeasurementTable"
+        umt=cls.__new__(cls)
+        MeasurementTable.__init__(umt,headers=[],meas_type=None,meas_group=meas_group)
+        umt._the_dataframe=dataframe
+        umt.meas_length=None
+        return umt
+
     @property
     def _dataframe(self):
         return self._the_dataframe
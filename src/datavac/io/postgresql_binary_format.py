@@ -1,19 +1,43 @@
 # See under Binary Format
 # https://www.postgresql.org/docs/16/sql-copy.html
 import io
+import math
 import struct
 from functools import partial
+from itertools import chain, repeat
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import Column
 
+# Any converter which raises will result in a NULL being written (see data_to_pgbin)
+
+def _finite_float_to_pg(x):
+    # Non-finite values (NaN, inf) are written as NULL rather than as float specials
+    if not math.isfinite(x:=float(x)): raise ValueError(f"Non-finite {x}")
+    return struct.pack("!d", x)
+
+def _object_to_pg(x):
+    # Object columns are generally strings, but may contain None/NaN for missing values
+    if x is None or x is pd.NA or (isinstance(x,float) and math.isnan(x)): raise ValueError("Missing")
+    return str(x).encode('utf-8')
+
+_PG_EPOCH=pd.Timestamp('2000-01-01')
+def _datetime_to_pg(x):
+    # Postgres timestamps are microseconds since 2000-01-01
+    return int((pd.Timestamp(x)-_PG_EPOCH)//pd.Timedelta(microseconds=1)).to_bytes(length=8,signed=True)
+
 pd_to_pg_converters= {
     'INT64': lambda x: int(x).to_bytes(length=4,signed=True),
     'INT32': lambda x: int(x).to_bytes(length=4,signed=True),
-    'FLOAT64': lambda x: struct.pack("!d", float(x)),
-    'FLOAT32': lambda x: struct.pack("!d", float(x)),
+    'FLOAT64': _finite_float_to_pg,
+    'FLOAT32': _finite_float_to_pg,
     'STRING': partial(str.encode,encoding='utf-8'),
-    'BOOLEAN': partial(bool.to_bytes,length=1),
+    'STR': partial(str.encode,encoding='utf-8'),
+    'OBJECT': _object_to_pg,
+    'BOOLEAN': lambda x: bool(x).to_bytes(length=1),
+    'BOOL': lambda x: bool(x).to_bytes(length=1),
+    'DATETIME64[NS]': _datetime_to_pg,
 }
 pg_to_pd_converters= {
     'INTEGER': partial(int.from_bytes,signed=True),
@@ -22,14 +46,8 @@ pg_to_pd_converters= {
     'BOOLEAN': bool.from_bytes,
 }
 
-def df_to_pgbin(df: pd.DataFrame, override_converters={}):
-    converters=[(override_converters.get(c,None) or pd_to_pg_converters[str(dtype).upper()])\
-                for c,dtype in df.dtypes.items()]
-    return data_to_pgbin(df.to_records(index=False),converters)
-
-def data_to_pgbin(data,converters):
-    bio=io.BytesIO()
-
+_NULL=b'\xff\xff\xff\xff'
+def _write_header(bio):
     # Header signature
     bio.write(b'PGCOPY\n\377\r\n\0')
     # Header flags
@@ -37,6 +55,124 @@ def data_to_pgbin(data,converters):
     # No header extension
     bio.write(b'\0\0\0\0')
 
+# Fixed-width types which df_to_pgbin encodes a whole column at a time with numpy (rather than per-field
+# with pd_to_pg_converters), as the big-endian numpy dtype for the field.  The results are the same.
+_NUMPY_ENCODINGS= {
+    'INT64': '>i4', 'INT32': '>i4',
+    'FLOAT64': '>f8', 'FLOAT32': '>f8',
+    'BOOLEAN': '?', 'BOOL': '?',
+    'DATETIME64[NS]': '>i8',
+}
+
+def _fixed_width_values(ser: pd.Series, npdtype: str) -> tuple[np.ndarray,np.ndarray]:
+    """Returns the values of a column to encode as npdtype (see _NUMPY_ENCODINGS), and a mask of which are NULL"""
+    isna=ser.isna().to_numpy()
+    if npdtype=='>i8':
+        arr=ser.to_numpy(dtype='datetime64[us]')
+        arr=(arr-np.datetime64(_PG_EPOCH,'us')).astype('int64')
+    elif npdtype=='>i4':
+        arr=ser.to_numpy(dtype='int64',na_value=0)
+        # Out-of-range integers become NULL, as with the converters
+        isna=isna|(arr<-2**31)|(arr>=2**31)
+    elif npdtype=='>f8':
+        arr=ser.to_numpy(dtype='float64',na_value=np.nan)
+        isna=isna|~np.isfinite(arr)
+    else:
+        arr=ser.to_numpy(dtype=bool,na_value=False)
+    return np.where(isna,0,arr), isna
+
+def _encode_fixed_width(arr: np.ndarray, isna: np.ndarray, npdtype: str) -> list[bytes]:
+    """Encodes a column as a list of size-prefixed fields (or NULLs), one per row"""
+    width=np.dtype(npdtype).itemsize
+    rec=np.empty(len(arr),dtype=[('size','>i4'),('value',npdtype)])
+    rec['size']=width
+    rec['value']=arr
+    buf=rec.tobytes()
+    fields=[buf[i:i+4+width] for i in range(0,len(buf),4+width)]
+    for i in np.flatnonzero(isna):
+        fields[i]=_NULL
+    return fields
+
+# Text types which df_to_pgbin encodes with _encode_text rather than per-field with pd_to_pg_converters
+_TEXT_DTYPES={'STRING','STR','OBJECT'}
+
+_pack_size=struct.Struct('>i').pack
+def _encode_text(ser: pd.Series) -> list[bytes]:
+    """Encodes a string/object column as a list of size-prefixed UTF-8 fields (or NULLs for missing values),
+    without the per-field converter call and try/except of _encode_with_converter"""
+    isna=ser.isna().to_numpy()
+    return [_NULL if na else _pack_size(len(b:=str(x).encode('utf-8')))+b for x,na in zip(ser.tolist(),isna)]
+
+def _encode_with_converter(values, converter) -> list[bytes]:
+    """Encodes a column (Series or other iterable) as a list of size-prefixed fields (or NULLs), one per row"""
+    fields=[]
+    for field in (values.tolist() if isinstance(values,pd.Series) else values):
+        try: cfield=converter(field)
+        except Exception: fields.append(_NULL)
+        else: fields.append(len(cfield).to_bytes(4,signed=True)+cfield)
+    return fields
+
+def df_to_pgbin(df: pd.DataFrame, override_converters={}):
+    fixed={}
+    for c,dtype in df.dtypes.items():
+        if (c not in override_converters) and (npdtype:=_NUMPY_ENCODINGS.get(str(dtype).upper(),None)):
+            fixed[c]=(*_fixed_width_values(df[c],npdtype),npdtype)
+
+    bio=io.BytesIO()
+    _write_header(bio)
+    if len(fixed)==len(df.columns) and not any(isna.any() for _,isna,_ in fixed.values()):
+        # All fixed-width with no NULLs, so the whole body is one numpy record array
+        rec=np.empty(len(df),dtype=[('nfields','>i2'),*chain.from_iterable(
+            [(f'size{i}','>i4'),(f'value{i}',npdtype)] for i,(_,_,npdtype) in enumerate(fixed.values()))])
+        rec['nfields']=len(df.columns)
+        for i,(arr,_,npdtype) in enumerate(fixed.values()):
+            rec[f'size{i}']=np.dtype(npdtype).itemsize
+            rec[f'value{i}']=arr
+        bio.write(rec.tobytes())
+    else:
+        columns=[_encode_fixed_width(*fixed[c]) if c in fixed else
+                 _encode_text(df[c]) if (c not in override_converters and str(dtype).upper() in _TEXT_DTYPES) else
+                 _encode_with_converter(df[c],override_converters.get(c,None) or pd_to_pg_converters[str(dtype).upper()])
+                 for c,dtype in df.dtypes.items()]
+        _write_rows(bio,columns)
+    # End marker
+    bio.write(b'\xff\xff')
+    bio.seek(0)
+    return bio
+
+def _write_rows(bio, columns: list[list[bytes]]):
+    # Each row is the number of fields, then the fields
+    nrows=len(columns[0]) if len(columns) else 0
+    rowhead=len(columns).to_bytes(2,signed=True)
+    bio.write(b''.join(chain.from_iterable(zip(repeat(rowhead,nrows),*columns))))
+
+def sweeps_to_pgbin(loadid: int, sweeps: pd.DataFrame, sweep_converter):
+    """Encodes the rows (loadid, measid, sweep, header) for each non-null cell of sweeps (indexed by measid,
+    with a column per header), without first stacking it into a long-form DataFrame."""
+    measids,sweep_fields,header_fields=[],[],[]
+    for header in sweeps.columns:
+        col=sweeps[header]
+        present=col.notna().to_numpy()
+        measids.append(sweeps.index.to_numpy()[present])
+        sweep_fields+=_encode_with_converter(col.to_numpy()[present],sweep_converter)
+        header_fields+=_encode_with_converter([header],pd_to_pg_converters['STR'])*int(present.sum())
+    measids=np.concatenate(measids) if len(measids) else np.array([],dtype='int64')
+    loadid_field=_encode_with_converter([loadid],pd_to_pg_converters['INT64'])[0]
+
+    bio=io.BytesIO()
+    _write_header(bio)
+    _write_rows(bio,[[loadid_field]*len(measids),
+                     _encode_fixed_width(measids,np.zeros(len(measids),dtype=bool),'>i4'),
+                     sweep_fields,header_fields])
+    # End marker
+    bio.write(b'\xff\xff')
+    bio.seek(0)
+    return bio
+
+def data_to_pgbin(data,converters):
+    bio=io.BytesIO()
+    _write_header(bio)
+
     for row in data:
 
         # Write the number of fields in the row
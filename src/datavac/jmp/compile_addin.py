@@ -8,7 +8,6 @@ import xml.etree.ElementTree as gfg
 from textwrap import dedent
 
 import dotenv
-import requests
 import warnings
 import sys
 import re
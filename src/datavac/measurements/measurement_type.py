@@ -11,3 +11,7 @@ class MeasurementType(YAMLObject):
         pass
     def get_preferred_dtype(self,header):
         return np.float32
+    @property
+    def all_sweeps_float32(self) -> bool:
+        """True if every header is float32 (ie get_preferred_dtype isn't overridden), so readers needn't check each"""
+        return type(self).get_preferred_dtype is MeasurementType.get_preferred_dtype
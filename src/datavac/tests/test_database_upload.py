@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import MetaData, Table, INTEGER, VARCHAR, DOUBLE_PRECISION
+
+from datavac.io.postgresql_binary_format import df_to_pgbin, data_to_pgbin, pd_to_pg_converters
+
+database=pytest.importorskip('datavac.io.database')
+
+
+def float_radius_diemap():
+    # An array_map generator whose radii come out float and die centers int (the opposite of the Dies table)
+    dbdf=pd.DataFrame({'DieXY':['1,1','1,2'],'DieRadius [mm]':[10.,12.],
+                       'DieCenterA [mm]':np.array([1,2]),'DieCenterB [mm]':np.array([3,4]),
+                       'DieX':[1,1],'DieY':[1,2]})
+    return dbdf,{}
+
+def test_dies_upload_casts_generator_dtypes():
+    dbdf,_=database._generate_diemap('datavac.tests.test_database_upload:float_radius_diemap',{})
+    # As in PostgreSQLDatabase.update_mask_info
+    diemdf=dbdf.assign(Mask='M')[['Mask','DieXY','DieRadius [mm]','DieCenterA [mm]','DieCenterB [mm]','DieX','DieY']]\
+        .reset_index(drop=True).reset_index(drop=False)
+    diemtab=Table('Dies',MetaData(),*database._dies_columns())
+    db=database.PostgreSQLDatabase.__new__(database.PostgreSQLDatabase)
+
+    # Each field should be encoded as its column type in the Dies table, whatever the generator's dtype
+    converters={INTEGER:pd_to_pg_converters['INT64'],DOUBLE_PRECISION:pd_to_pg_converters['FLOAT64'],
+                VARCHAR:pd_to_pg_converters['OBJECT']}
+    expected=data_to_pgbin(diemdf.itertuples(index=False),
+                           [converters[c.type.__class__] for c in diemtab.columns]).getvalue()
+    assert df_to_pgbin(db._cast_for_table(diemdf,diemtab)).getvalue()==expected
+    assert df_to_pgbin(diemdf).getvalue()!=expected
+
+if __name__=='__main__':
+    test_dies_upload_casts_generator_dtypes()
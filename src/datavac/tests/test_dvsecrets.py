@@ -0,0 +1,22 @@
+import pytest
+
+from datavac.appserve.dvsecrets import _parse_dbstring
+
+
+def test_parse_dbstring():
+    assert _parse_dbstring("Server=a;Port=5432;Database=db")=={'Server':'a','Port':'5432','Database':'db'}
+    # Whitespace around keys and values and a trailing semicolon are ignored
+    assert _parse_dbstring(" Server = a ; Port=1;\n")=={'Server':'a','Port':'1'}
+    # Braces allow semicolons (and anything else but a closing brace) in a value
+    assert _parse_dbstring("Uid=me;Password={p;w= d};Port=1")=={'Uid':'me','Password':'p;w= d','Port':'1'}
+    # An '=' inside an unbraced value is kept
+    assert _parse_dbstring("Password=a=b;Port=1")=={'Password':'a=b','Port':'1'}
+
+@pytest.mark.parametrize('dbstring',["Server=a;Bad;Port=1","Server=a;Port","Server=a;;Port=1",
+                                     "Password={a}b;Port=1","Password={a;b","=a;Port=1"])
+def test_parse_dbstring_malformed(dbstring):
+    with pytest.raises(ValueError):
+        _parse_dbstring(dbstring)
+
+if __name__=='__main__':
+    test_parse_dbstring()
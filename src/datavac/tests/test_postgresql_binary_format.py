@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from datavac.io.postgresql_binary_format import df_to_pgbin, sweeps_to_pgbin, data_to_pgbin, pd_to_pg_converters
+
+
+def _reference(df):
+    # The per-field converters, one row at a time
+    converters=[pd_to_pg_converters[str(dtype).upper()] for dtype in df.dtypes]
+    return data_to_pgbin(df.itertuples(index=False),converters).getvalue()
+
+def test_df_to_pgbin_with_nulls():
+    df=pd.DataFrame({
+        'i':np.array([1,-5,2**31,-2**31],dtype='int64'),
+        'f':np.array([1.5,np.nan,np.inf,-2.],dtype='float64'),
+        's':pd.Series(['a',None,'ü',np.nan],dtype=object),
+        'b':np.array([True,False,True,False]),
+        't':pd.to_datetime(['2024-01-02 03:04:05.000006','1999-12-31 00:00:00.000000',None,'2000-01-01 00:00:00.000000']).astype('datetime64[ns]'),
+    })
+    assert df_to_pgbin(df).getvalue()==_reference(df)
+
+def test_df_to_pgbin_all_fixed_width():
+    df=pd.DataFrame({
+        'i':np.array([1,2,3],dtype='int64'),
+        'f':np.array([1.,-2.5,1e300],dtype='float64'),
+        'b':np.array([False,True,True]),
+    })
+    assert df_to_pgbin(df).getvalue()==_reference(df)
+
+def test_df_to_pgbin_override_converters():
+    df=pd.DataFrame({'i':np.array([1,2],dtype='int64'),'s':pd.Series(['x','y'],dtype=object)})
+    conv=lambda s: (s*2).encode('utf-8')
+    assert df_to_pgbin(df,override_converters={'s':conv}).getvalue()==\
+        data_to_pgbin(df.itertuples(index=False),[pd_to_pg_converters['INT64'],conv]).getvalue()
+
+def test_sweeps_to_pgbin():
+    sweeps=pd.DataFrame({'VG':[np.r_[1.,2.],None,np.r_[3.]],
+                         'ID':[np.r_[4.],np.r_[5.,6.],None]},index=[10,11,12])
+    conv=lambda s: s.tobytes()
+    rows=[(7,measid,sweep,header) for header in sweeps.columns
+          for measid,sweep in sweeps[header].items() if sweep is not None]
+    assert sweeps_to_pgbin(7,sweeps,conv).getvalue()==\
+        data_to_pgbin(rows,[pd_to_pg_converters['INT64'],pd_to_pg_converters['INT64'],
+                            conv,pd_to_pg_converters['STR']]).getvalue()
+
+if __name__=='__main__':
+    test_df_to_pgbin_with_nulls()
+    test_df_to_pgbin_all_fixed_width()
+    test_df_to_pgbin_override_converters()
+    test_sweeps_to_pgbin()
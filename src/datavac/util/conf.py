@@ -1,15 +1,16 @@
 import sys
 import argparse
 import os
-import warnings
+import shutil
+import ssl
 from pathlib import Path
 from importlib import resources as irsc
+from urllib.error import HTTPError
+from urllib.request import urlopen
 
 import platformdirs
-import requests
 import yaml
 from dotenv import load_dotenv
-from urllib3.exceptions import InsecureRequestWarning
 
 from datavac.util.cli import cli_helper
 from datavac.util.util import import_modfunc
@@ -21,6 +22,8 @@ class Config():
     def __init__(self):
         with open(Path(os.environ['DATAVACUUM_CONFIG_DIR'])/"project.yaml",'r') as f:
             self._yaml=yaml.safe_load(f)
+        self._dependent_analyses={}
+        self._dependency_meas_groups_for_analyses={}
 
     def __getattr__(self, item):
         return self._yaml[item]
@@ -28,6 +31,9 @@ class Config():
     def __getitem__(self, item):
         return self._yaml[item]
 
+    def get(self, item, default=None):
+        return self._yaml.get(item, default)
+
     def get_meas_type(self, meas_group):
         res=self.measurement_groups[meas_group]['meas_type']
         if type(res) is str:
@@ -36,19 +42,26 @@ class Config():
             return import_modfunc(res[0])(**res[1])
 
     def get_dependent_analyses(self, meas_groups):
-        return list(set(an for an,an_info in self.higher_analyses.items()\
-            if any(mg in meas_groups for mg in
-                   list(an_info.get('required_dependencies',{}).keys())+ \
-                   list(an_info.get('attempt_dependencies',{}).keys()))))
+        # Memoized per set of meas groups, since the config doesn't change once loaded
+        if (key:=frozenset(meas_groups)) not in self._dependent_analyses:
+            self._dependent_analyses[key]=list(set(an for an,an_info in self.higher_analyses.items()\
+                if any(mg in key for mg in
+                       list(an_info.get('required_dependencies',{}).keys())+ \
+                       list(an_info.get('attempt_dependencies',{}).keys()))))
+        return list(self._dependent_analyses[key])
 
     def get_dependency_meas_groups_for_analyses(self, analyses, required_only=False):
-        if required_only:
-            return dict(set([(mg,dname) for an in analyses
-                 for mg,dname in self.higher_analyses[an]['required_dependencies'].items()]))
-        else:
-            return dict(set([(mg,dname) for an in analyses
-                 for mg,dname in list(self.higher_analyses[an]['required_dependencies'].items())+\
-                             list(self.higher_analyses[an].get('attempt_dependencies',{}).items())]))
+        # Memoized per set of analyses, like get_dependent_analyses
+        if (key:=(frozenset(analyses),required_only)) not in self._dependency_meas_groups_for_analyses:
+            if required_only:
+                res=dict(set([(mg,dname) for an in key[0]
+                     for mg,dname in self.higher_analyses[an]['required_dependencies'].items()]))
+            else:
+                res=dict(set([(mg,dname) for an in key[0]
+                     for mg,dname in list(self.higher_analyses[an]['required_dependencies'].items())+\
+                                 list(self.higher_analyses[an].get('attempt_dependencies',{}).items())]))
+            self._dependency_meas_groups_for_analyses[key]=res
+        return dict(self._dependency_meas_groups_for_analyses[key])
 
     def get_dependency_meas_groups_for_meas_groups(self, meas_groups, required_only=False):
         if required_only:
@@ -168,15 +181,20 @@ def cli_context_install(*args):
     CONTEXT_PATH=Path(os.environ.get('DATAVACUUM_CONTEXT_DIR',None)
                       or platformdirs.user_config_path('ALL',appauthor='DataVacuum'))
 
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore",category=InsecureRequestWarning)
-        res=requests.get(namespace.url+"/context",verify=False)
-    assert res.status_code==200, f"Failed to download context from {namespace.url}"
-
-    filepath=CONTEXT_PATH/res.headers['Content-Disposition'].split("filename=")[1]
-    with open(filepath,'wb') as f:
-        f.write(res.content)
-    cli_context_use(res.headers['Content-Disposition'].split("filename=")[1].split(".dvcontext.env")[0])
+    # Not verifying the server certificate (as before with requests' verify=False), see TODO above
+    sslcontext=ssl.create_default_context()
+    sslcontext.check_hostname=False
+    sslcontext.verify_mode=ssl.CERT_NONE
+    # urlopen raises on any non-2xx response, so that's where a failed download shows up
+    try: res=urlopen(namespace.url+"/context",context=sslcontext)
+    except HTTPError as e:
+        raise AssertionError(f"Failed to download context from {namespace.url} ({e.code} {e.reason})") from e
+    with res:
+        filename=res.headers['Content-Disposition'].split("filename=")[1]
+        filepath=CONTEXT_PATH/filename
+        with open(filepath,'wb') as f:
+            shutil.copyfileobj(res,f)
+    cli_context_use(filename.split(".dvcontext.env")[0])
     print(f"Context installed to {filepath} and activated.")
 
 def cli_context_edit(*args):